@@ -0,0 +1,139 @@
+from hashlib import md5
+from time import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from recipes.models import Tag
+
+
+def version_key(model):
+    return f'api:data_version:{model._meta.label_lower}'
+
+
+def changed_key(model):
+    return f'api:changed:{model._meta.label_lower}'
+
+
+def get_version(model):
+    """Возвращает версию данных модели и время её последнего изменения."""
+    keys = version_key(model), changed_key(model)
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        # Ключ мог быть вытеснен из кеша: новая версия не должна
+        # совпасть с прежними, поэтому она начинается со времени в мс.
+        now = time()
+        cache.add(keys[0], int(now * 1000), None)
+        cache.add(keys[1], int(now), None)
+        values = cache.get_many(keys)
+    return values.get(keys[0]), values.get(keys[1])
+
+
+def bump_version(model):
+    """Делает недействительными закешированные ответы по модели.
+
+    Версия увеличивается через cache.incr, поэтому одновременные
+    изменения не получают одну и ту же версию (в Redis, Memcached и
+    LocMemCache incr атомарен).
+    """
+    try:
+        cache.incr(version_key(model))
+    except ValueError:
+        get_version(model)
+        cache.incr(version_key(model))
+    cache.set(changed_key(model), int(time()), None)
+
+
+def get_tag_ids_by_slug():
+    """Соответствие слагов тегов их id, закешированное до изменения тегов."""
+    version, _ = get_version(Tag)
+    return cache.get_or_set(
+        f'api:tag_ids:{version}',
+        # Кеш строится по основной базе, даже если запрос читает с
+        # реплики: иначе отставшие данные сохранились бы под новой версией.
+        lambda: dict(Tag.objects.using(router.db_for_write(Tag))
+                     .values_list('slug', 'id')),
+        None
+    )
+
+
+class CachedResponseMixin:
+    """Кеширует ответы list и retrieve для справочных данных.
+
+    Ключ кеша строится из версий моделей cache_models и параметров
+    запроса, поэтому изменение любой из моделей сразу делает
+    старые ответы недоступными. Ответ снабжается заголовками ETag
+    и Last-Modified, повторный запрос с ними получает 304.
+    """
+
+    cache_models = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.acached_response(
+            super().alist, request, *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acached_response(
+            super().aretrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request, versions):
+        params = sorted(request.query_params.lists())
+        raw = f'{versions}:{sorted(self.kwargs.items())}:{params}'
+        return (f'api:response:{self.basename}:{self.action}:'
+                f'{md5(raw.encode()).hexdigest()}')
+
+    def get_cached_response(self, request):
+        """Ключ кеша, заголовки и готовый ответ (304 или из кеша);
+        ответ None, если его нужно построить."""
+        versions = [get_version(model) for model in self.cache_models]
+        key = self.get_cache_key(request, versions)
+        headers = {
+            'ETag': f'"{key.rsplit(":", 1)[-1]}"',
+            'Last-Modified': max(changed for _, changed in versions),
+        }
+        response = get_conditional_response(
+            request, etag=headers['ETag'],
+            last_modified=headers['Last-Modified'])
+        if response is None:
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+        return key, headers, response
+
+    def cache_response(self, key, response):
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+
+    def add_cache_headers(self, response, headers):
+        if response.status_code in (200, 304):
+            response['ETag'] = headers['ETag']
+            response['Last-Modified'] = http_date(headers['Last-Modified'])
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        key, headers, response = self.get_cached_response(request)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            self.cache_response(key, response)
+        return self.add_cache_headers(response, headers)
+
+    async def acached_response(self, handler, request, *args, **kwargs):
+        key, headers, response = await sync_to_async(
+            self.get_cached_response)(request)
+        if response is None:
+            response = await handler(request, *args, **kwargs)
+            await sync_to_async(self.cache_response)(key, response)
+        return self.add_cache_headers(response, headers)
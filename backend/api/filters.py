@@ -1,21 +1,46 @@
+from django.db.models import Exists, F, OuterRef
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Recipe
+from api.cache import get_tag_ids_by_slug
+from api.ingredient_index import ingredient_index
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.search import search_recipes
+
+RANKED_ORDERINGS = {
+    'popular': 'ranking__popularity',
+    'trending': 'ranking__trending',
+}
+RANKED_ORDERING = ('-rank', '-id')
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids_by_slug()]
 
 
 class IngredientFilter(SearchFilter):
+    """Поиск ингредиентов по началу названия через индекс в памяти.
+
+    Индекс возвращает список, а не QuerySet, поэтому применяется
+    только к списку: страница ингредиента ищется в БД, как обычно.
+    """
+
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        prefix = request.query_params.get(self.search_param, '')
+        if view.action != 'list' or not prefix.strip():
+            return queryset
+        return ingredient_index.search(prefix)
+
 
 class RecipeFilter(filters.FilterSet):
     author = filters.NumberFilter(
-        field_name='author__id',
-        lookup_expr='icontains'
+        field_name='author_id'
     )
-    tags = filters.CharFilter(
-        field_name='tags__slug',
-        lookup_expr='icontains'
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags'
     )
     is_favorited = filters.NumberFilter(
         method='filter_is_favorited'
@@ -23,24 +48,62 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.NumberFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(
+        method='filter_search'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'Популярные'),
+            ('trending', 'Популярные за последние дни'),
+        ),
+        method='filter_ordering'
+    )
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        tag_ids_by_slug = get_tag_ids_by_slug()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'),
+                tag_id__in=[tag_ids_by_slug[slug] for slug in value]
+            )
+        ))
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorite__user=user)
+            return queryset.filter(Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_cart__user=user)
+            return queryset.filter(Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ))
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по рейтингу, заранее посчитанному командой
+        refresh_rankings, - чтение по индексу без агрегации."""
+        return queryset.filter(ranking__isnull=False).annotate(
+            rank=F(RANKED_ORDERINGS[value])).order_by(*RANKED_ORDERING)
+
     class Meta:
         model = Recipe
         fields = (
             'author',
             'tags',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search',
+            'ordering'
         )
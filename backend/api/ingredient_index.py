@@ -0,0 +1,71 @@
+from bisect import bisect_left
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.db import router
+
+from api.cache import get_version
+from recipes.models import Ingredient
+
+
+def normalize(value):
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientPrefixIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Индекс строится при первом обращении и перестраивается, когда
+    меняется версия данных Ingredient (см. api.cache.bump_version), а
+    также не реже раза в INGREDIENT_INDEX_MAX_AGE секунд - на случай
+    изменений в обход сигналов и команд, меняющих версию.
+    Поиск по префиксу выполняется двоичным поиском без запросов к БД.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.built = None
+        self.keys = []
+        self.rows = []
+
+    def build(self):
+        rows = sorted(
+            (normalize(name), name, pk, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.using(
+                router.db_for_write(Ingredient)
+            ).values_list('id', 'name', 'measurement_unit')
+        )
+        return [row[0] for row in rows], rows
+
+    def is_fresh(self, version):
+        return (self.version == version and monotonic() - self.built
+                < settings.INGREDIENT_INDEX_MAX_AGE)
+
+    def ensure_fresh(self):
+        version = get_version(Ingredient)
+        if self.is_fresh(version):
+            return
+        with self.lock:
+            if not self.is_fresh(version):
+                self.keys, self.rows = self.build()
+                self.version = version
+                self.built = monotonic()
+
+    def search(self, prefix):
+        """Возвращает ингредиенты, название которых начинается с prefix."""
+        self.ensure_fresh()
+        keys, rows = self.keys, self.rows
+        prefix = normalize(prefix)
+        result = []
+        for index in range(bisect_left(keys, prefix), len(keys)):
+            if not keys[index].startswith(prefix):
+                break
+            _, name, pk, measurement_unit = rows[index]
+            result.append(Ingredient(
+                id=pk, name=name, measurement_unit=measurement_unit))
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
@@ -0,0 +1,207 @@
+"""Замеры стоимости запросов к API.
+
+InstrumentationMiddleware считает для каждого запроса количество
+запросов к БД, время в БД, время работы представления DRF без учёта
+БД (ViewTimingMixin: выборка, пагинация, сериализация) и общее время
+ответа.
+Результат пишется строкой JSON в лог api.instrumentation, а при
+SERVER_TIMING=True (по умолчанию - с DEBUG) отдаётся и в заголовке
+Server-Timing. Для представлений из QUERY_BUDGETS проверяется бюджет
+запросов к БД (ключ "МЕТОД имя" важнее ключа "имя", None отключает
+проверку): превышение пишется в лог, а при QUERY_BUDGET_ENFORCE=True
+(в тестах и замерах) вызывает ошибку.
+Медленные запросы к БД выборочно пишутся в лог
+api.instrumentation.slow вместе с полем сериализатора, из которого
+они были вызваны.
+"""
+import json
+import logging
+import random
+import sys
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger('api.instrumentation')
+slow_query_logger = logging.getLogger('api.instrumentation.slow')
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+SERIALIZER_FIELD_METHODS = ('to_representation', 'get_attribute')
+
+
+class QueryBudgetExceeded(Exception):
+    """Представление выполнило больше запросов к БД, чем разрешено."""
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else request.path
+
+
+def find_serializer_field():
+    """Поле сериализатора, при выводе которого выполняется запрос."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        field = frame.f_locals.get('self')
+        if (frame.f_code.co_name in SERIALIZER_FIELD_METHODS
+                and isinstance(field, serializers.Field)
+                and field.field_name):
+            return f'{type(field.parent).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+class RequestMetrics:
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_time = 0.0
+        self.view_start = None
+        self.total_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            if (duration * 1000 >= settings.SLOW_QUERY_MS
+                    and random.random() < settings.SLOW_QUERY_SAMPLE_RATE):
+                self.log_slow_query(sql, duration)
+
+    def log_slow_query(self, sql, duration):
+        slow_query_logger.warning(json.dumps({
+            'view': get_view_name(self.request),
+            'duration_ms': round(duration * 1000, 1),
+            'serializer_field': find_serializer_field(),
+            'sql': sql,
+        }, ensure_ascii=False))
+
+    def as_dict(self, response):
+        return {
+            'view': get_view_name(self.request),
+            'method': self.request.method,
+            'status': response.status_code,
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 1),
+            'view_ms': round(self.view_time * 1000, 1),
+            'total_ms': round(self.total_time * 1000, 1),
+        }
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'view;dur={self.view_time * 1000:.1f}, '
+            f'total;dur={self.total_time * 1000:.1f}'
+        )
+
+
+class ViewTimingMixin:
+    """Время работы обработчика представления DRF без времени БД.
+
+    Отсчёт начинается после аутентификации и проверки прав и
+    заканчивается перед согласованием формата ответа, поэтому в него
+    входят фильтрация, пагинация и сериализация.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.view_start = (perf_counter(), metrics.db_time)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        metrics = current_metrics.get()
+        if metrics is not None and metrics.view_start is not None:
+            start, db_time = metrics.view_start
+            metrics.view_time += (perf_counter() - start
+                                  - (metrics.db_time - db_time))
+            metrics.view_start = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def check_query_budget(metrics):
+    view = get_view_name(metrics.request)
+    budget = settings.QUERY_BUDGETS.get(
+        f'{metrics.request.method} {view}',
+        settings.QUERY_BUDGETS.get(view)
+    )
+    if budget is None or metrics.queries <= budget:
+        return
+    message = (f'{view}: {metrics.queries} запросов к БД '
+               f'при бюджете {budget}')
+    if settings.QUERY_BUDGET_ENFORCE:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class InstrumentationMiddleware:
+    """Замеры запроса; ставится первым в MIDDLEWARE.
+
+    У потоковых ответов учитывается только работа до начала
+    отправки тела. В режиме ASGI запросы к БД выполняются в потоке
+    запроса, поэтому счётчик ставится на соединения этого потока.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.INSTRUMENTATION:
+            return self.get_response(request)
+        metrics = RequestMetrics(request)
+        token = current_metrics.set(metrics)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                self.wrap_connections(stack, metrics)
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(metrics, response, start)
+
+    async def __acall__(self, request):
+        if not settings.INSTRUMENTATION:
+            return await self.get_response(request)
+        metrics = RequestMetrics(request)
+        token = current_metrics.set(metrics)
+        start = perf_counter()
+        stack = ExitStack()
+        try:
+            await sync_to_async(self.wrap_connections)(stack, metrics)
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_metrics.reset(token)
+        return self.finish(metrics, response, start)
+
+    def wrap_connections(self, stack, metrics):
+        for connection in connections.all():
+            stack.enter_context(
+                connection.execute_wrapper(metrics.record_query))
+
+    def finish(self, metrics, response, start):
+        metrics.total_time = perf_counter() - start
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing()
+        logger.info(json.dumps(metrics.as_dict(response), ensure_ascii=False))
+        check_query_budget(metrics)
+        return response
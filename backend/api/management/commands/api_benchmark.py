@@ -0,0 +1,152 @@
+import base64
+from functools import partial
+from io import BytesIO
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+SCENARIOS = {
+    'recipes': '/api/recipes/?limit={size}',
+    'subscriptions': '/api/users/subscriptions/?limit={size}',
+    'recipe_create': '/api/recipes/',
+    'cookable': '/api/recipes/cookable/?limit={size}&{ingredients}',
+}
+
+
+class Command(BaseCommand):
+    help = ('Замер количества запросов к БД и времени ответа '
+            'эндпоинтов API на текущей базе данных.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenario', choices=sorted(SCENARIOS),
+            help='Сценарий замера.'
+        )
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[6, 50, 500],
+            help='Размеры страницы (для recipe_create - число ингредиентов).'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Количество повторов для каждого размера.'
+        )
+        parser.add_argument(
+            '--page', type=int, default=1,
+            help='Номер замеряемой страницы.'
+        )
+        parser.add_argument(
+            '--cursor', action='store_true',
+            help='Курсорная пагинация вместо постраничной.'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=10,
+            help='Сколько самых частых ингредиентов передать в cookable.'
+        )
+        parser.add_argument(
+            '--email',
+            help='Email пользователя, от имени которого идут запросы.'
+        )
+
+    def handle(self, *args, **options):
+        client = APIClient()
+        if options['email']:
+            user = User.objects.filter(email=options['email']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь {options["email"]} не найден')
+            client.force_authenticate(user)
+        url = SCENARIOS[options['scenario']]
+        if '{ingredients}' in url:
+            url = url.replace('{ingredients}', self.get_ingredients_query(
+                options['ingredients']))
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ALLOWED_HOSTS=hosts):
+            if options['scenario'] == 'recipe_create':
+                for size in options['sizes']:
+                    send = partial(self.create_recipe, client, url,
+                                   self.get_recipe_payload(size))
+                    self.measure(size, options['repeat'], send, 201)
+                return
+            for size in options['sizes']:
+                page_url = self.get_page_url(
+                    client, url.format(size=size), options['page'],
+                    options['cursor']
+                )
+                if page_url is None:
+                    self.stdout.write(
+                        f'size={size:<5} страницы {options["page"]} нет')
+                    continue
+                self.measure(size, options['repeat'],
+                             partial(client.get, page_url))
+
+    def get_page_url(self, client, url, page, cursor):
+        if not cursor:
+            return f'{url}&page={page}' if page > 1 else url
+        url = f'{url}&cursor='
+        for _ in range(page - 1):
+            next_url = client.get(url).data.get('next')
+            if next_url is None:
+                return None
+            url = next_url
+        return url
+
+    def get_ingredients_query(self, count):
+        ingredients = Ingredient.objects.annotate(
+            recipes=Count('ingredientrecipe')
+        ).order_by('-recipes').values_list('id', flat=True)[:count]
+        return '&'.join(
+            f'ingredients={ingredient}' for ingredient in ingredients)
+
+    def get_recipe_payload(self, size):
+        ingredients = list(
+            Ingredient.objects.values_list('id', flat=True)[:size])
+        tag = Tag.objects.values_list('id', flat=True).first()
+        if len(ingredients) < size or tag is None:
+            raise CommandError(
+                f'Для рецепта нужны тег и {size} ингредиентов в базе')
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64)).save(buffer, 'PNG')
+        return {
+            'name': 'Рецепт для замера',
+            'text': 'Текст',
+            'cooking_time': 10,
+            'tags': [tag],
+            'ingredients': [
+                {'id': ingredient, 'amount': 1} for ingredient in ingredients
+            ],
+            'image': 'data:image/png;base64,' + base64.b64encode(
+                buffer.getvalue()).decode(),
+        }
+
+    def create_recipe(self, client, url, payload):
+        with transaction.atomic():
+            response = client.post(url, payload, format='json')
+            transaction.set_rollback(True)
+        return response
+
+    def measure(self, size, repeat, send, expected_status=200):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = perf_counter()
+                response = send()
+                timings.append(perf_counter() - start)
+            if response.status_code != expected_status:
+                raise CommandError(
+                    f'Ответ со статусом {response.status_code}: '
+                    f'{getattr(response, "data", "")}')
+        self.stdout.write(
+            f'size={size:<5} queries={len(queries):<4} '
+            f'median={median(timings) * 1000:.1f}ms '
+            f'max={max(timings) * 1000:.1f}ms'
+        )
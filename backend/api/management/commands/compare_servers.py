@@ -0,0 +1,208 @@
+import math
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+from collections import defaultdict
+from http.client import HTTPConnection, HTTPException
+from itertools import cycle
+from time import monotonic, perf_counter, sleep
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe
+from users.models import Follow
+
+MODES = ('wsgi', 'asgi')
+STARTUP_TIMEOUT = 30
+
+
+def percentile(values, share):
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = ('Сравнение режимов WSGI (sync-воркеры gunicorn) и ASGI '
+            '(uvicorn-воркеры с асинхронными представлениями чтения) '
+            'на текущей базе данных. Для каждого режима запускается '
+            'gunicorn, в течение --duration секунд --concurrency '
+            'клиентов запрашивают список и страницу рецепта, '
+            'ингредиенты, теги и подписки. Медленные клиенты '
+            '(--slow-clients) отправляют заголовки по строке в секунду '
+            'и занимают sync-воркер, как клиенты на плохой сети без '
+            'буферизующего прокси.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes', nargs='+', choices=MODES, default=list(MODES),
+            help='Сравниваемые режимы.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Количество воркеров gunicorn.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=20,
+            help='Количество одновременных клиентов.'
+        )
+        parser.add_argument(
+            '--slow-clients', type=int, default=0,
+            help='Количество медленных клиентов.'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность замера каждого режима в секундах.'
+        )
+
+    def handle(self, *args, **options):
+        urls = self.get_urls()
+        headers = self.get_headers()
+        for mode in options['modes']:
+            with tempfile.TemporaryDirectory() as metrics_dir:
+                port = free_port()
+                server = self.start_server(
+                    mode, port, options['workers'], metrics_dir)
+                try:
+                    results = self.run_load(port, urls, headers, options)
+                finally:
+                    server.terminate()
+                    server.wait()
+            self.report(mode, results, options['duration'])
+
+    def get_urls(self):
+        recipe_ids = list(
+            Recipe.objects.values_list('id', flat=True)[:100])
+        names = list(Ingredient.objects.values_list('name', flat=True)[:50])
+        if not recipe_ids or not names:
+            raise CommandError(
+                'Нет рецептов или ингредиентов: сначала выполните '
+                'bd_load и generate_data')
+        lists = [
+            ('recipes-list', '/api/recipes/'),
+            ('tags-list', '/api/tags/'),
+            ('subscriptions', '/api/users/subscriptions/?recipes_limit=3'),
+        ]
+        details = [
+            ('recipes-detail', f'/api/recipes/{recipe_id}/')
+            for recipe_id in recipe_ids
+        ] + [
+            ('ingredients-list', f'/api/ingredients/?name={quote(name[:2])}')
+            for name in names
+        ]
+        # Чередование: на каждый запрос страницы рецепта и ингредиентов
+        # приходится запрос списка, тегов или подписок.
+        return [url for pair in zip(cycle(lists), details) for url in pair]
+
+    def get_headers(self):
+        user_id = Follow.objects.values_list('user', flat=True).first()
+        if user_id is None:
+            raise CommandError('Нет подписок: сначала выполните generate_data')
+        token, _ = Token.objects.get_or_create(user_id=user_id)
+        return {'Authorization': f'Token {token.key}'}
+
+    def start_server(self, mode, port, workers, metrics_dir):
+        env = {
+            **os.environ,
+            'ASGI': str(mode == 'asgi'),
+            'ALLOWED_HOSTS': '127.0.0.1',
+            'METRICS_DIR': metrics_dir,
+            'INSTRUMENTATION_LOG_LEVEL': 'WARNING',
+        }
+        log = tempfile.TemporaryFile()
+        server = subprocess.Popen(
+            ['gunicorn', '--bind', f'127.0.0.1:{port}',
+             '--workers', str(workers)],
+            cwd=settings.BASE_DIR, env=env, stdout=log, stderr=log)
+        deadline = monotonic() + STARTUP_TIMEOUT
+        while monotonic() < deadline:
+            if server.poll() is not None:
+                log.seek(0)
+                raise CommandError(
+                    f'gunicorn ({mode}) завершился при запуске:\n'
+                    f'{log.read().decode(errors="replace")[-2000:]}')
+            connection = HTTPConnection('127.0.0.1', port, timeout=5)
+            try:
+                connection.request('GET', '/api/tags/')
+                connection.getresponse().read()
+                return server
+            except (OSError, HTTPException):
+                sleep(0.2)
+            finally:
+                connection.close()
+        server.terminate()
+        raise CommandError(f'gunicorn ({mode}) не запустился')
+
+    def run_load(self, port, urls, headers, options):
+        deadline = monotonic() + options['duration']
+        results = []
+        threads = [
+            threading.Thread(target=self.slow_client,
+                             args=(port, headers, deadline))
+            for _ in range(options['slow_clients'])
+        ]
+        step = max(1, len(urls) // max(1, options['concurrency']))
+        threads += [
+            threading.Thread(target=self.client, args=(
+                port, urls[index * step:] + urls[:index * step], headers,
+                deadline, results))
+            for index in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def client(self, port, urls, headers, deadline, results):
+        connection = HTTPConnection('127.0.0.1', port, timeout=60)
+        for label, url in cycle(urls):
+            if monotonic() >= deadline:
+                break
+            start = perf_counter()
+            try:
+                connection.request('GET', url, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, HTTPException):
+                connection.close()
+                status = 0
+            results.append((label, status, perf_counter() - start))
+        connection.close()
+
+    def slow_client(self, port, headers, deadline):
+        with socket.create_connection(('127.0.0.1', port)) as sock:
+            sock.sendall(b'GET /api/tags/ HTTP/1.1\r\nHost: 127.0.0.1\r\n')
+            lines = cycle([f'{name}: {value}\r\n'.encode()
+                           for name, value in headers.items()])
+            while monotonic() < deadline:
+                try:
+                    sock.sendall(next(lines))
+                except OSError:
+                    return
+                sleep(1)
+
+    def report(self, mode, results, duration):
+        self.stdout.write(f'{mode}: {len(results)} запросов, '
+                          f'{len(results) / duration:.1f} rps')
+        by_label = defaultdict(list)
+        for label, status, elapsed in results:
+            by_label[label].append((status, elapsed))
+        for label, rows in sorted(by_label.items()):
+            timings = sorted(elapsed * 1000 for _, elapsed in rows)
+            errors = sum(status != 200 for status, _ in rows)
+            self.stdout.write(
+                f'  {label:<18} {len(rows):>6} errors={errors:<4} '
+                f'p50={percentile(timings, 0.5):>7.1f}ms '
+                f'p95={percentile(timings, 0.95):>7.1f}ms '
+                f'p99={percentile(timings, 0.99):>7.1f}ms')
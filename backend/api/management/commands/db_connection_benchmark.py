@@ -0,0 +1,89 @@
+from statistics import median
+from time import perf_counter
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Замер накладных расходов на соединение с БД: запросы '
+            'проходят через WSGI-обработчик Django, как под gunicorn, '
+            'сначала с CONN_MAX_AGE=0 (новое соединение на каждый '
+            'запрос), затем с постоянным соединением.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запроса; по умолчанию - первый рецепт.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Количество запросов в каждом режиме.'
+        )
+        parser.add_argument(
+            '--conn-max-age', type=int, default=600,
+            help='CONN_MAX_AGE для режима постоянного соединения.'
+        )
+
+    def handle(self, *args, **options):
+        url = options['url']
+        if url is None:
+            recipe_id = Recipe.objects.values_list('id', flat=True).first()
+            if recipe_id is None:
+                raise CommandError(
+                    'Нет рецептов: сначала выполните generate_data')
+            url = f'/api/recipes/{recipe_id}/'
+        handler = WSGIHandler()
+        self.connects = 0
+        connection_created.connect(self.count_connect)
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        results = {}
+        try:
+            with override_settings(ALLOWED_HOSTS=hosts):
+                for mode, max_age in (('per-request', 0),
+                                      ('persistent', options['conn_max_age'])):
+                    results[mode] = self.measure(
+                        handler, url, max_age, options['requests'])
+        finally:
+            connection_created.disconnect(self.count_connect)
+            connection.close()
+        for mode, (timings, connects) in results.items():
+            self.stdout.write(
+                f'{mode:<12} connects={connects:<5} '
+                f'median={median(timings) * 1000:.2f}ms '
+                f'max={max(timings) * 1000:.2f}ms')
+        overhead = (median(results['per-request'][0])
+                    - median(results['persistent'][0]))
+        self.stdout.write(
+            f'Накладные расходы соединения: {overhead * 1000:.2f}ms '
+            f'на запрос')
+
+    def count_connect(self, sender, connection, **kwargs):
+        self.connects += 1
+
+    def measure(self, handler, url, max_age, count):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        self.connects = 0
+        parts = urlsplit(url)
+        timings = []
+        for _ in range(count):
+            environ = {'PATH_INFO': parts.path, 'QUERY_STRING': parts.query}
+            setup_testing_defaults(environ)
+            start = perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+            timings.append(perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'Ответ со статусом {response.status_code}')
+        return timings, self.connects
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.services import generate_thumbnail, get_thumbnail_name
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создание недостающих превью картинок рецептов.'
+
+    def handle(self, *args, **options):
+        created = 0
+        recipes = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).values_list('id', 'image', 'thumbnail')
+        for recipe_id, image, thumbnail in recipes.iterator():
+            if thumbnail == get_thumbnail_name(image):
+                continue
+            generate_thumbnail(recipe_id, image)
+            created += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Создано превью: {created}'))
@@ -0,0 +1,48 @@
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from api.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Сравнение поиска ингредиентов по префиксу: индекс в памяти '
+            'против запроса name ILIKE к БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--length', type=int, default=2,
+            help='Длина префиксов, взятых из названий ингредиентов.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=200,
+            help='Максимальное количество проверяемых префиксов.'
+        )
+
+    def handle(self, *args, **options):
+        names = Ingredient.objects.values_list('name', flat=True)
+        prefixes = sorted({
+            name[:options['length']].lower() for name in names
+        })[:options['limit']]
+        if not prefixes:
+            self.stdout.write(self.style.WARNING('Ингредиентов нет'))
+            return
+        ingredient_index.search('')
+        self.report('SearchFilter (БД)', prefixes, lambda prefix: list(
+            Ingredient.objects.filter(name__istartswith=prefix)))
+        self.report('Индекс в памяти', prefixes, ingredient_index.search)
+
+    def report(self, title, prefixes, search):
+        timings = []
+        for prefix in prefixes:
+            start = perf_counter()
+            search(prefix)
+            timings.append(perf_counter() - start)
+        timings.sort()
+        self.stdout.write(
+            f'{title:<20} prefixes={len(prefixes):<4} '
+            f'median={median(timings) * 1000:.3f}ms '
+            f'p95={timings[int(len(timings) * 0.95)] * 1000:.3f}ms'
+        )
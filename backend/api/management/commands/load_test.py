@@ -0,0 +1,203 @@
+import math
+import random
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import User
+
+SCENARIOS = {
+    'feed': 40,
+    'recipe': 20,
+    'subscriptions': 10,
+    'toggle': 25,
+    'download': 5,
+}
+# Сценарии, которые изменяют данные; выполняются только с --allow-writes.
+WRITE_SCENARIOS = ('toggle',)
+TOGGLES = ('favorite', 'shopping_cart', 'subscribe')
+
+
+def percentile(values, share):
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный сценарий API: лента, рецепт, подписки, '
+            'переключатели избранного/корзины/подписки и выгрузка '
+            'списка покупок; выводятся p50/p95/p99 и количество '
+            'запросов к БД на запрос. Это не HTTP-нагрузка: запросы '
+            'выполняются в этом процессе через APIClient на текущей '
+            'базе данных, без сети, веб-сервера и воркеров, поэтому '
+            'время ответа меньше, чем у реального сервера. Для '
+            'нагрузки по HTTP нужен внешний генератор. Переключатели '
+            'изменяют данные и выполняются только с --allow-writes. '
+            'Для --concurrency больше 1 нужен Postgres: SQLite '
+            'блокирует параллельные записи.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='Количество сценариев.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Количество параллельных потоков.'
+        )
+        parser.add_argument(
+            '--users', type=int, default=100,
+            help='Сколько случайных пользователей отправляют запросы.'
+        )
+        parser.add_argument(
+            '--weights', nargs='+', default=[],
+            metavar='SCENARIO=WEIGHT',
+            help='Веса сценариев, например feed=50 download=0.'
+        )
+        parser.add_argument(
+            '--allow-writes', action='store_true',
+            help='Выполнять сценарии, изменяющие данные (toggle).'
+        )
+        parser.add_argument(
+            '--enforce-budgets', action='store_true',
+            help='Считать ошибкой превышение QUERY_BUDGETS.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора случайных чисел.'
+        )
+
+    def handle(self, *args, **options):
+        weights = self.get_weights(
+            options['weights'], options['allow_writes'])
+        rng = random.Random(options['seed'])
+        user_ids = list(User.objects.values_list('id', flat=True))
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.author_ids = list(User.objects.filter(
+            recipes_count__gt=0).values_list('id', flat=True))
+        if not self.recipe_ids or not self.author_ids:
+            raise CommandError(
+                'Нет рецептов: сначала выполните generate_data')
+        self.users = list(User.objects.filter(pk__in=rng.sample(
+            user_ids, min(options['users'], len(user_ids)))))
+        scenarios = rng.choices(
+            list(weights), weights=list(weights.values()),
+            k=options['requests'])
+        concurrency = max(1, options['concurrency'])
+        chunks = [
+            (scenarios[index::concurrency], rng.random())
+            for index in range(concurrency)
+        ]
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        start = perf_counter()
+        with override_settings(
+                ALLOWED_HOSTS=hosts,
+                QUERY_BUDGET_ENFORCE=options['enforce_budgets']):
+            with ThreadPoolExecutor(concurrency) as executor:
+                results = [
+                    result
+                    for chunk in executor.map(self.run_worker, chunks)
+                    for result in chunk
+                ]
+        self.report(results, perf_counter() - start)
+
+    def get_weights(self, overrides, allow_writes):
+        weights = dict(SCENARIOS)
+        if not allow_writes:
+            weights.update(dict.fromkeys(WRITE_SCENARIOS, 0))
+        for override in overrides:
+            name, _, weight = override.partition('=')
+            if name not in weights or not weight.isdigit():
+                raise CommandError(f'Неверный вес сценария: {override}')
+            if (name in WRITE_SCENARIOS and int(weight)
+                    and not allow_writes):
+                raise CommandError(
+                    f'Сценарий {name} изменяет данные: '
+                    'добавьте --allow-writes')
+            weights[name] = int(weight)
+        if not any(weights.values()):
+            raise CommandError('Все веса сценариев нулевые')
+        return weights
+
+    def run_worker(self, chunk):
+        scenarios, seed = chunk
+        rng = random.Random(seed)
+        client = APIClient(raise_request_exception=False)
+        results = []
+        try:
+            for scenario in scenarios:
+                client.force_authenticate(rng.choice(self.users))
+                scenario_method = getattr(self, f'scenario_{scenario}')
+                for status, elapsed, queries in scenario_method(client, rng):
+                    results.append((scenario, status, elapsed, queries))
+        finally:
+            connection.close()
+        return results
+
+    def call(self, client, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            response = getattr(client, method)(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = perf_counter() - start
+        return response.status_code, elapsed, len(queries)
+
+    def scenario_feed(self, client, rng):
+        yield self.call(
+            client, 'get', f'/api/recipes/?page={rng.randint(1, 5)}')
+
+    def scenario_recipe(self, client, rng):
+        yield self.call(
+            client, 'get', f'/api/recipes/{rng.choice(self.recipe_ids)}/')
+
+    def scenario_subscriptions(self, client, rng):
+        yield self.call(
+            client, 'get', '/api/users/subscriptions/?recipes_limit=3')
+
+    def scenario_toggle(self, client, rng):
+        """Добавление, а если объект уже добавлен - удаление."""
+        toggle = rng.choice(TOGGLES)
+        if toggle == 'subscribe':
+            url = f'/api/users/{rng.choice(self.author_ids)}/subscribe/'
+        else:
+            url = f'/api/recipes/{rng.choice(self.recipe_ids)}/{toggle}/'
+        result = self.call(client, 'post', url)
+        if result[0] == 400:
+            result = self.call(client, 'delete', url)
+        yield result
+
+    def scenario_download(self, client, rng):
+        yield self.call(
+            client, 'get', '/api/recipes/download_shopping_cart/')
+
+    def report(self, results, duration):
+        by_scenario = defaultdict(list)
+        for scenario, status, elapsed, queries in results:
+            by_scenario[scenario].append((status, elapsed, queries))
+        self.stdout.write(
+            f'{"scenario":<14} {"count":>6} {"errors":>6} {"p50":>9} '
+            f'{"p95":>9} {"p99":>9} {"queries":>8} {"max_q":>6}')
+        for scenario in SCENARIOS:
+            rows = by_scenario.get(scenario)
+            if not rows:
+                continue
+            timings = sorted(elapsed * 1000 for _, elapsed, _ in rows)
+            queries = [count for _, _, count in rows]
+            errors = sum(status >= 400 for status, _, _ in rows)
+            self.stdout.write(
+                f'{scenario:<14} {len(rows):>6} {errors:>6} '
+                f'{percentile(timings, 0.5):>7.1f}ms '
+                f'{percentile(timings, 0.95):>7.1f}ms '
+                f'{percentile(timings, 0.99):>7.1f}ms '
+                f'{sum(queries) / len(queries):>8.1f} {max(queries):>6}'
+            )
+        self.stdout.write(
+            f'Всего запросов: {len(results)} за {duration:.1f}s '
+            f'({len(results) / duration:.1f} rps)')
@@ -0,0 +1,83 @@
+import random
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes, update_search_index
+from recipes.synthetic import SyntheticData
+from users.models import User
+
+PAGE_SIZE = 6
+
+
+class Command(BaseCommand):
+    help = ('Сравнение полнотекстового поиска рецептов с поиском '
+            'через icontains на синтетических рецептах. Сгенерированные '
+            'данные удаляются откатом транзакции.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=100_000,
+            help='Количество синтетических рецептов.'
+        )
+        parser.add_argument(
+            '--queries', type=int, default=50,
+            help='Количество поисковых запросов.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора случайных чисел.'
+        )
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('id', 'name'))
+        author = User.objects.first()
+        if len(names) < 10 or author is None or not Tag.objects.exists():
+            raise CommandError(
+                'Нужны пользователь, тег и хотя бы 10 ингредиентов в базе')
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            start = perf_counter()
+            SyntheticData(options['seed']).create_recipes(
+                options['recipes'], [author.pk], names,
+                list(Tag.objects.values_list('id', flat=True)))
+            self.stdout.write(
+                f'Сгенерировано рецептов: {options["recipes"]} '
+                f'за {perf_counter() - start:.1f}s')
+            start = perf_counter()
+            update_search_index()
+            self.stdout.write(
+                f'Индекс построен за {perf_counter() - start:.1f}s')
+            queries = [
+                rng.choice(names)[1].split()[0]
+                for _ in range(options['queries'])
+            ]
+            self.report('icontains', queries, self.search_icontains)
+            self.report('Полнотекстовый', queries, lambda value: (
+                search_recipes(Recipe.objects.all(), value)))
+            transaction.set_rollback(True)
+
+    def search_icontains(self, value):
+        return Recipe.objects.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+            | Q(recipe_ingredients__ingredient__name__icontains=value)
+        ).distinct()
+
+    def report(self, title, queries, search):
+        timings = []
+        for value in queries:
+            start = perf_counter()
+            queryset = search(value)
+            queryset.count()
+            list(queryset[:PAGE_SIZE])
+            timings.append(perf_counter() - start)
+        timings.sort()
+        self.stdout.write(
+            f'{title:<16} queries={len(queries):<4} '
+            f'median={median(timings) * 1000:.1f}ms '
+            f'p95={timings[int(len(timings) * 0.95)] * 1000:.1f}ms'
+        )
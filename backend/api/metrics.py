@@ -0,0 +1,371 @@
+"""Метрики API в текстовом формате Prometheus.
+
+Без METRICS_DIR значения хранятся в памяти процесса. Если METRICS_DIR
+задан (под gunicorn его выставляет gunicorn.conf.py), каждый процесс
+пишет свои значения в отдельный файл через mmap, а /metrics
+суммирует файлы всех воркеров. Счётчики и гистограммы хранятся в
+файлах counter_<pid>.db и переживают перезапуск воркера, gauge - в
+gauge_<pid>.db, которые удаляются при выходе воркера.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+from time import perf_counter
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+INITIAL_FILE_SIZE = 64 * 1024
+HEADER = struct.Struct('<i4x')
+KEY_LENGTH = struct.Struct('<i')
+VALUE = struct.Struct('<d')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class MemoryStore:
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, amount):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        with self.lock:
+            self.values[key] = value
+
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+def read_entries(data):
+    """Записи файла метрик: (ключ, значение, смещение значения)."""
+    used = HEADER.unpack_from(data, 0)[0] if len(data) >= HEADER.size else 0
+    position = HEADER.size
+    while position < used:
+        length = KEY_LENGTH.unpack_from(data, position)[0]
+        start = position + KEY_LENGTH.size
+        key = bytes(data[start:start + length]).decode('utf-8')
+        position = start + length + padding(length)
+        yield key, VALUE.unpack_from(data, position)[0], position
+        position += VALUE.size
+
+
+def padding(length):
+    """Выравнивание значения по 8 байтам."""
+    return -(KEY_LENGTH.size + length) % 8
+
+
+class MmapStore:
+    """Значения одного процесса в файле, отображённом в память.
+
+    Формат: заголовок с занятым размером, затем записи
+    (длина ключа, ключ, выравнивание, double).
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        self.capacity = os.fstat(self.file.fileno()).st_size
+        if self.capacity == 0:
+            self.capacity = INITIAL_FILE_SIZE
+            self.file.truncate(self.capacity)
+        self.map = mmap.mmap(self.file.fileno(), self.capacity)
+        if HEADER.unpack_from(self.map, 0)[0] == 0:
+            HEADER.pack_into(self.map, 0, HEADER.size)
+        self.used = HEADER.unpack_from(self.map, 0)[0]
+        self.positions = {
+            key: position for key, _, position in read_entries(self.map)
+        }
+
+    def get_position(self, key):
+        if key in self.positions:
+            return self.positions[key]
+        encoded = key.encode('utf-8')
+        entry = (KEY_LENGTH.pack(len(encoded)) + encoded
+                 + b' ' * padding(len(encoded)) + VALUE.pack(0.0))
+        if self.used + len(entry) > self.capacity:
+            while self.used + len(entry) > self.capacity:
+                self.capacity *= 2
+            self.map.close()
+            self.file.truncate(self.capacity)
+            self.map = mmap.mmap(self.file.fileno(), self.capacity)
+        self.map[self.used:self.used + len(entry)] = entry
+        self.used += len(entry)
+        HEADER.pack_into(self.map, 0, self.used)
+        self.positions[key] = self.used - VALUE.size
+        return self.positions[key]
+
+    def add(self, key, amount):
+        with self.lock:
+            position = self.get_position(key)
+            value = VALUE.unpack_from(self.map, position)[0]
+            VALUE.pack_into(self.map, position, value + amount)
+
+    def set(self, key, value):
+        with self.lock:
+            VALUE.pack_into(self.map, self.get_position(key), value)
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.stores = {}
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def get_store(self, kind):
+        pid = os.getpid()
+        store = self.stores.get(kind) if pid == self.pid else None
+        if store is not None:
+            return store
+        # Без блокировки два потока создали бы два хранилища, и значения
+        # одного из них потерялись бы, а MmapStore открыл бы файл дважды.
+        with self.lock:
+            if pid != self.pid:
+                # После fork у воркера должны быть свои файлы.
+                self.stores = {}
+                self.pid = pid
+            if kind not in self.stores:
+                if settings.METRICS_DIR:
+                    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                    self.stores[kind] = MmapStore(os.path.join(
+                        settings.METRICS_DIR, f'{kind}_{pid}.db'))
+                else:
+                    self.stores[kind] = MemoryStore()
+            return self.stores[kind]
+
+    def collect(self):
+        """Сумма значений всех процессов по каждому ключу."""
+        values = defaultdict(float)
+        if not settings.METRICS_DIR:
+            with self.lock:
+                stores = list(self.stores.values())
+            for store in stores:
+                for key, value in store.items():
+                    values[key] += value
+            return values
+        for name in os.listdir(settings.METRICS_DIR):
+            if not name.endswith('.db'):
+                continue
+            path = os.path.join(settings.METRICS_DIR, name)
+            try:
+                with open(path, 'rb') as file:
+                    data = file.read()
+            except FileNotFoundError:
+                continue
+            for key, value, _ in read_entries(data):
+                values[key] += value
+        return values
+
+    def render(self):
+        samples = defaultdict(list)
+        for key, value in self.collect().items():
+            name, sample, labels = json.loads(key)
+            samples[name].append((sample, labels, value))
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            lines.extend(metric.render(samples.get(name, [])))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def format_sample(sample, labels, value):
+    if labels:
+        labels = ','.join(
+            f'{name}="{escape(label)}"' for name, label in labels)
+        sample = f'{sample}{{{labels}}}'
+    return f'{sample} {value:g}' if value != int(value) else (
+        f'{sample} {int(value)}')
+
+
+class Metric:
+    type = None
+    store_kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.register(self)
+
+    def key(self, sample, labels):
+        if set(labels) - set(self.labelnames) - {'le'}:
+            raise ValueError(f'Неизвестные метки метрики {self.name}')
+        return json.dumps(
+            [self.name, sample, sorted(labels.items())], ensure_ascii=False)
+
+    def store(self):
+        return registry.get_store(self.store_kind)
+
+    def render(self, samples):
+        return [
+            format_sample(sample, labels, value)
+            for sample, labels, value in sorted(samples)
+        ]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self.store().add(self.key(f'{self.name}_total', labels), amount)
+
+
+class Gauge(Metric):
+    """Значение процесса; /metrics показывает сумму по живым воркерам."""
+
+    type = 'gauge'
+    store_kind = 'gauge'
+
+    def set(self, value, **labels):
+        self.store().set(self.key(self.name, labels), value)
+
+
+class Histogram(Metric):
+    """Гистограмма; корзины хранятся не накопительно, а
+    суммируются при выводе."""
+
+    type = 'histogram'
+
+    def __init__(self, *args, buckets=LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        store = self.store()
+        bucket = next((str(bound) for bound in self.buckets
+                       if value <= bound), '+Inf')
+        store.add(self.key(
+            f'{self.name}_bucket', {**labels, 'le': bucket}), 1)
+        store.add(self.key(f'{self.name}_sum', labels), value)
+        store.add(self.key(f'{self.name}_count', labels), 1)
+
+    def render(self, samples):
+        series = defaultdict(dict)
+        for sample, labels, value in samples:
+            labels = [tuple(label) for label in labels]
+            if sample.endswith('_bucket'):
+                le = dict(labels)['le']
+                labels = tuple(label for label in labels if label[0] != 'le')
+                series[labels][le] = value
+            else:
+                series[tuple(labels)][sample] = value
+        lines = []
+        for labels, values in sorted(series.items()):
+            total = 0
+            for bound in (*map(str, self.buckets), '+Inf'):
+                total += values.get(bound, 0)
+                lines.append(format_sample(
+                    f'{self.name}_bucket',
+                    sorted([*labels, ('le', bound)]), total))
+            for suffix in ('_sum', '_count'):
+                lines.append(format_sample(
+                    self.name + suffix, labels,
+                    values.get(self.name + suffix, 0)))
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время ответа API по маршрутам.',
+    ('route', 'method', 'status'),
+)
+TOGGLES = Counter(
+    'foodgram_toggles',
+    'Добавления и удаления избранного, корзины и подписок.',
+    ('kind', 'action'),
+)
+SHOPPING_LIST_DOWNLOADS = Counter(
+    'foodgram_shopping_list_downloads',
+    'Выгрузки списка покупок.',
+    ('format',),
+)
+DB_CONNECTIONS = Gauge(
+    'foodgram_db_connections',
+    'Открытые соединения с БД.',
+    ('alias',),
+)
+
+
+def mark_process_dead(pid):
+    """Удаляет gauge-файл завершившегося воркера."""
+    if settings.METRICS_DIR:
+        path = os.path.join(settings.METRICS_DIR, f'gauge_{pid}.db')
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class MetricsMiddleware:
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        start = perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, start)
+        self.count_connections()
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        start = perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, start)
+        # Соединения с БД принадлежат потоку запроса.
+        await sync_to_async(self.count_connections)()
+        return response
+
+    def observe(self, request, response, start):
+        match = getattr(request, 'resolver_match', None)
+        REQUEST_LATENCY.observe(
+            perf_counter() - start,
+            route=match.view_name if match else 'unmatched',
+            method=request.method,
+            status=response.status_code,
+        )
+
+    def count_connections(self):
+        for connection in connections.all(initialized_only=True):
+            DB_CONNECTIONS.set(
+                int(connection.connection is not None),
+                alias=connection.alias)
+
+
+def metrics_view(request):
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,7 +1,16 @@
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import QuerySet
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 
+from api.metrics import TOGGLES
+from api.serializers import ExistingRecipesSerializer, RecipeIdsSerializer
+from api.services import create_unique
+from recipes.counters import delete_counted, recount_recipes
 from recipes.models import Recipe
 
 
@@ -16,24 +25,153 @@ class AddOrDelCartFavoriteMixin:
             **kwargs):
         name_model = model.__doc__
         user = self.request.user
-        recipe = get_object_or_404(Recipe, id=self.kwargs.get('pk'))
-        relation_exist = model.objects.filter(
-            user=user, recipe=recipe).exists()
+        recipe_id = self.kwargs.get('pk')
         if request.method == 'POST':
-            if relation_exist:
+            recipe = get_object_or_404(Recipe, id=recipe_id)
+            relation = create_unique(model, user=user, recipe=recipe)
+            if relation is None:
                 return Response(
                     {"errors": "Этот рецепт уже есть в {}".format(name_model)},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            serializer = serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=user, recipe=recipe)
-            return Response(serializer.data,
+            TOGGLES.inc(kind=model._meta.model_name, action='add')
+            return Response(serializer(relation).data,
                             status=status.HTTP_201_CREATED)
-        if not relation_exist:
+        deleted = delete_counted(
+            model.objects.filter(user=user, recipe_id=recipe_id))
+        if not deleted:
+            get_object_or_404(Recipe, id=recipe_id)
             return Response(
                 {"errors": "Рецепт не находится в {}'".format(name_model)},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        model.objects.get(recipe=recipe, user=user).delete()
+        TOGGLES.inc(kind=model._meta.model_name, action='remove')
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def bulk_action_for_cart_or_favorite(self, request, model, serializer):
+        """Добавляет или удаляет сразу несколько рецептов.
+
+        Добавление выполняется одним INSERT, уже добавленные рецепты
+        пропускаются. Для DELETE id можно передать и в query-параметре
+        recipes, так как не все клиенты отправляют тело DELETE-запроса.
+        """
+        user = self.request.user
+        data = request.data
+        if request.method == 'DELETE' and 'recipes' not in data:
+            data = {'recipes': request.query_params.getlist('recipes')}
+        if request.method == 'POST':
+            recipes_serializer = ExistingRecipesSerializer(data=data)
+            recipes_serializer.is_valid(raise_exception=True)
+            relations = [
+                model(user=user, recipe=recipe)
+                for recipe in recipes_serializer.validated_data['recipes']
+            ]
+            model.objects.bulk_create(relations, ignore_conflicts=True)
+            recount_recipes([relation.recipe_id for relation in relations])
+            return Response(serializer(relations, many=True).data,
+                            status=status.HTTP_201_CREATED)
+        ids_serializer = RecipeIdsSerializer(data=data)
+        ids_serializer.is_valid(raise_exception=True)
+        delete_counted(model.objects.filter(
+            user=user,
+            recipe_id__in=ids_serializer.validated_data['recipes']
+        ))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AsyncReadMixin:
+    """Асинхронные действия чтения для режима ASGI.
+
+    При ASYNC_VIEWS=True представления маршрутов с действиями из
+    async_actions становятся корутинами: эти действия выполняются
+    методами a<действие> в цикле событий, страница и объект
+    выбираются асинхронным ORM. Аутентификация, проверка прав и
+    фильтры работают как обычно, но в потоке запроса. Остальные
+    действия того же маршрута (например, создание рецепта)
+    выполняются обычным dispatch в потоке.
+    """
+
+    async_actions = ('list', 'retrieve')
+    is_async = False
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        is_async = settings.ASYNC_VIEWS and any(
+            action in cls.async_actions for action in actions.values())
+        view = super().as_view(actions, is_async=is_async, **initkwargs)
+        if is_async:
+            markcoroutinefunction(view)
+        return view
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.is_async:
+            return self.adispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """APIView.dispatch с асинхронным обработчиком действия."""
+        action = self.action_map.get(request.method.lower())
+        if action not in self.async_actions:
+            return await sync_to_async(super().dispatch)(
+                request, *args, **kwargs)
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            handler = getattr(self, f'a{action}')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs)
+        return self.response
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        if isinstance(queryset, QuerySet):
+            queryset = [obj async for obj in queryset]
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(await self.aget_object())
+        return Response(serializer.data)
+
+    async def apaginate_queryset(self, queryset):
+        paginator = self.paginator
+        if paginator is None:
+            return None
+        if hasattr(paginator, 'apaginate_queryset'):
+            return await paginator.apaginate_queryset(
+                queryset, self.request, view=self)
+        return await sync_to_async(paginator.paginate_queryset)(
+            queryset, self.request, view=self)
+
+    async def aget_object(self):
+        queryset = await sync_to_async(self.filter_queryset)(
+            self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        value = self.kwargs[lookup_url_kwarg]
+        if isinstance(queryset, QuerySet):
+            try:
+                obj = await queryset.aget(**{self.lookup_field: value})
+            except (queryset.model.DoesNotExist, TypeError, ValueError,
+                    ValidationError):
+                raise Http404
+        else:
+            # Фильтр вернул список объектов, а не QuerySet.
+            obj = next((
+                obj for obj in queryset
+                if str(getattr(obj, self.lookup_field)) == str(value)
+            ), None)
+            if obj is None:
+                raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
@@ -1,6 +1,188 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from datetime import date, datetime
+from decimal import Decimal
 
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
 
-class RecipesPagination(PageNumberPagination):
+from api.filters import RANKED_ORDERING, RANKED_ORDERINGS
+from recipes.models import COOKABLE_ORDERING
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с apaginate_queryset для асинхронных
+    представлений: COUNT и выборка страницы идут через асинхронный
+    ORM, ответ строится обычным get_paginated_response."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return [obj async for obj in self.page.object_list]
+
+
+class RecipesPagination(AsyncPageNumberPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+
+
+def encode_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} нельзя сохранить в курсоре')
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Курсорная пагинация по всем полям сортировки.
+
+    CursorPagination фильтрует только по первому полю сортировки, а
+    строки с одинаковым значением пропускает через OFFSET, который
+    ограничен offset_cutoff. При сортировке по рейтингу или числу
+    недостающих ингредиентов одинаковых значений много, и курсор
+    зацикливается. Здесь курсор хранит значения всех полей последней
+    строки страницы, а следующая страница выбирается условием
+    (a < x) OR (a = x AND b < y) OR ... без OFFSET. Последнее поле
+    сортировки должно быть уникальным.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.get_cursor_position()
+        ordering = self.ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in ordering
+            ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(
+                ordering, position))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        if self.page:
+            self.next_position = self._get_position_from_instance(
+                self.page[-1], self.ordering)
+            self.previous_position = self._get_position_from_instance(
+                self.page[0], self.ordering)
+        else:
+            self.has_next = self.has_previous = False
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_cursor_position(self):
+        if self.cursor is None or self.cursor.position is None:
+            return None
+        try:
+            position = json.loads(self.cursor.position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(position, list)
+                or len(position) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    @staticmethod
+    def get_keyset_filter(ordering, position):
+        """Строки после position в порядке ordering."""
+        keyset = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return keyset
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = [
+            instance[field.lstrip('-')] if isinstance(instance, dict)
+            else getattr(instance, field.lstrip('-'))
+            for field in ordering
+        ]
+        return json.dumps(values, default=encode_value)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.next_position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True, position=self.previous_position))
+
+
+class RecipesCursorPagination(KeysetCursorPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if view.action == 'cookable':
+            return COOKABLE_ORDERING
+        if request.query_params.get('search', '').strip():
+            # Результаты поиска сортируются по релевантности, а её нельзя
+            # сравнить в условии курсора: в SQLite она считается в extra().
+            raise ValidationError({'search': [
+                'Поиск не поддерживает курсорную пагинацию, '
+                'используйте page.']})
+        if request.query_params.get('ordering') in RANKED_ORDERINGS:
+            return RANKED_ORDERING
+        return super().get_ordering(request, queryset, view)
+
+
+class OptionalCursorPaginationMixin:
+    """Включает курсорную пагинацию, если в запросе передан ?cursor=.
+
+    Без параметра cursor используется pagination_class, поэтому
+    постраничный режим для фронтенда не меняется. Курсорный режим
+    не считает COUNT(*) и не использует OFFSET.
+    """
+
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            cursor_class = self.cursor_pagination_class
+            if (cursor_class is not None
+                    and cursor_class.cursor_query_param
+                    in self.request.query_params):
+                pagination_class = cursor_class
+            self._paginator = (
+                pagination_class() if pagination_class else None)
+        return self._paginator
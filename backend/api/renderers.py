@@ -0,0 +1,144 @@
+import csv
+from abc import ABCMeta, abstractmethod
+from io import BytesIO
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+SHOPPING_LIST_TITLE = '>>>СПИСОК НЕОБХОДИМЫХ ИНГРЕДИЕНТОВ<<<'
+EMPTY_SHOPPING_LIST = 'УПС! Ваш список пуст :('
+
+
+async def stream_in_thread(chunks, batch_size):
+    """Асинхронный итератор по синхронному итератору chunks.
+
+    Под ASGI Django 4.2 читает синхронный итератор StreamingHttpResponse
+    целиком и только потом отправляет ответ. Здесь фрагменты читаются
+    пачками по batch_size в потоке запроса (там же, где открыт курсор
+    БД) и отправляются по мере готовности.
+    """
+    chunks = iter(chunks)
+
+    def next_batch():
+        return list(islice(chunks, batch_size))
+
+    while batch := await sync_to_async(next_batch)():
+        for chunk in batch:
+            yield chunk
+
+
+class ShoppingListRenderer(renderers.BaseRenderer, metaclass=ABCMeta):
+    """Базовый рендерер списка покупок.
+
+    content() получает итератор строк с полями ingredient__name,
+    ingredient__measurement_unit и amount_ingredients. При
+    streaming=True он возвращает итератор фрагментов файла, который
+    отдаётся потоком, иначе - файл целиком в bytes. Через Response
+    эти рендереры не используются: ошибки и список в формате json
+    отдаёт JSONRenderer.
+    """
+
+    charset = 'utf-8'
+    streaming = True
+
+    @abstractmethod
+    def content(self, ingredients):
+        """Содержимое файла по итератору строк списка."""
+
+    def get_content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def get_filename(self):
+        return f'shopping_list.{self.format}'
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def content(self, ingredients):
+        yield SHOPPING_LIST_TITLE + '\n'
+        empty = True
+        for index, ingredient in enumerate(ingredients, 1):
+            empty = False
+            raw = [
+                str(index) + '.',
+                ingredient['ingredient__name'].title() + ' -',
+                str(ingredient['amount_ingredients']),
+                ingredient['ingredient__measurement_unit']
+            ]
+            yield '\n' + ' '.join(raw)
+        if empty:
+            yield '\n' + EMPTY_SHOPPING_LIST
+
+
+class Echo:
+    """Псевдофайл для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def content(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единица'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['amount_ingredients'],
+                ingredient['ingredient__measurement_unit'],
+            ))
+
+
+class ShoppingListPDFRenderer(ShoppingListRenderer):
+    """PDF не отдаётся потоком: reportlab записывает таблицу ссылок на
+    объекты и число страниц только при сохранении документа, поэтому
+    файл собирается в памяти целиком."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    streaming = False
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def content(self, ingredients):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT))
+        buffer = BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        _, height = A4
+        lines = ShoppingListTextRenderer().content(ingredients)
+        y = height - self.margin
+        for line in lines:
+            if y < self.margin:
+                pdf.showPage()
+                y = height - self.margin
+            pdf.setFont(self.font_name, self.font_size)
+            pdf.drawString(self.margin, y, line.strip())
+            y -= self.line_height
+        pdf.save()
+        return buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListPDFRenderer,
+    renderers.JSONRenderer,
+)
@@ -0,0 +1,128 @@
+"""Чтение с реплики для безопасных запросов к API.
+
+Представления с ReplicaReadMixin выполняют GET, HEAD и OPTIONS на
+базе DB_REPLICA_ALIAS, если она есть в DATABASES; запись всегда идёт
+в основную базу. Пользователь, который только что что-то изменил,
+REPLICA_STICKY_SECONDS секунд читает с основной базы, чтобы видеть
+свои изменения несмотря на отставание реплики. Признак хранится в
+кеше по id пользователя (для нескольких воркеров нужен общий кеш) и
+в cookie, которая работает и с кешем в памяти процесса.
+
+Данные, которые кешируются под версией модели (ответы справочников,
+слаги тегов, индекс ингредиентов), строятся только по основной базе.
+
+Локально реплику можно проверить копией файла базы SQLite,
+добавленной в DATABASES под алиасом DB_REPLICA_ALIAS: копия не
+обновляется, и разница между чтением с реплики и с основной базы
+видна сразу.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from inspect import iscoroutine
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = 'primary_db'
+
+read_database = ContextVar('read_database', default=None)
+
+
+def get_replica_alias():
+    alias = settings.DB_REPLICA_ALIAS
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def use_database(alias):
+    """Чтение с базы alias; None - основная база."""
+    token = read_database.set(alias)
+    try:
+        yield
+    finally:
+        read_database.reset(token)
+
+
+async def await_on_database(alias, coroutine):
+    with use_database(alias):
+        return await coroutine
+
+
+def run_on_database(alias, func, *args, **kwargs):
+    """Вызывает func с чтением с базы alias. Если func вернула
+    корутину (асинхронное представление), база выбирается на время
+    её выполнения."""
+    with use_database(alias):
+        result = func(*args, **kwargs)
+    if iscoroutine(result):
+        return await_on_database(alias, result)
+    return result
+
+
+def get_pin_key(user):
+    return f'replica:pin:{user.pk}'
+
+
+def is_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    user = request.user
+    return user.is_authenticated and cache.get(get_pin_key(user)) is not None
+
+
+def pin_to_primary(request, response):
+    if request.user.is_authenticated:
+        cache.set(get_pin_key(request.user), True,
+                  settings.REPLICA_STICKY_SECONDS)
+    response.set_cookie(PIN_COOKIE, '1',
+                        max_age=settings.REPLICA_STICKY_SECONDS,
+                        httponly=True, samesite='Lax')
+
+
+class ReplicaRouter:
+    """Чтение с базы, выбранной ReplicaReadMixin, запись в основную."""
+
+    def db_for_read(self, model, **hints):
+        return read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная база.
+        databases = {DEFAULT_DB_ALIAS, settings.DB_REPLICA_ALIAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """Безопасные запросы представления читают с реплики.
+
+    Аутентификация всегда идёт по основной базе: новый токен
+    действует сразу, удалённый сразу перестаёт действовать.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        alias = None
+        if request.method in SAFE_METHODS:
+            alias = get_replica_alias()
+        return run_on_database(
+            alias, super().dispatch, request, *args, **kwargs)
+
+    def perform_authentication(self, request):
+        with use_database(None):
+            super().perform_authentication(request)
+        if read_database.get() is not None and is_pinned(request):
+            # Значение сбросит run_on_database после ответа.
+            read_database.set(None)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and get_replica_alias() is not None):
+            pin_to_primary(request, response)
+        return super().finalize_response(
+            request, response, *args, **kwargs)
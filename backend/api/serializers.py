@@ -61,6 +61,38 @@ class FavoriteSerializer(serializers.ModelSerializer):
         )
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False
+    )
+
+
+class ExistingRecipesSerializer(RecipeIdsSerializer):
+
+    def validate_recipes(self, recipes):
+        found = Recipe.objects.in_bulk(recipes)
+        missing = set(recipes) - found.keys()
+        if missing:
+            raise serializers.ValidationError(
+                'Рецепты с id {} не существуют!'.format(
+                    ', '.join(map(str, sorted(missing))))
+            )
+        return [found[recipe_id] for recipe_id in dict.fromkeys(recipes)]
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=100
+    )
+    max_missing = serializers.IntegerField(
+        min_value=0,
+        required=False
+    )
+
+
 class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -96,9 +128,7 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
 
 
 class IngredientForRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
@@ -144,11 +174,14 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'thumbnail',
             'text',
             'cooking_time',
         )
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -156,6 +189,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -163,11 +198,22 @@ class RecipeGetSerializer(serializers.ModelSerializer):
             user=user, recipe=obj).exists()
 
 
+class CookableRecipeSerializer(RecipeGetSerializer):
+    matched_ingredients = serializers.IntegerField(read_only=True)
+    missing_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeGetSerializer.Meta):
+        fields = RecipeGetSerializer.Meta.fields + (
+            'matched_ingredients',
+            'missing_ingredients',
+        )
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        write_only=True
     )
     ingredients = IngredientForRecipeSerializer(
         many=True,
@@ -194,7 +240,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             ingredient_recipe.append(
                 IngredientRecipe(
                     recipe=recipe,
-                    ingredient=ingredient['id'],
+                    ingredient_id=ingredient['id'],
                     amount=ingredient['amount']
                 )
             )
@@ -207,32 +253,72 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        return self.add_ingredients_and_tags(ingredients, tags, recipe)
+        self.add_ingredients_and_tags(ingredients, tags, recipe)
+        return recipe
+
+    def update_ingredients(self, ingredients, recipe):
+        """Применяет к ингредиентам рецепта только изменения."""
+        current = {
+            row.ingredient_id: row for row in recipe.recipe_ingredients.all()
+        }
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            recipe.recipe_ingredients.filter(
+                ingredient_id__in=removed).delete()
+        changed = []
+        for ingredient_id, row in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ['amount'])
+        added = [
+            IngredientRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        if added:
+            IngredientRecipe.objects.bulk_create(added)
 
     @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         super().update(instance, validated_data)
-        recipe = Recipe.objects.get(name=instance.name)
-        instance.ingredients.clear()
-        instance.tags.clear()
-        return self.add_ingredients_and_tags(ingredients, tags, recipe)
+        self.update_ingredients(ingredients, instance)
+        instance.tags.set(tags)
+        return instance
 
     def to_representation(self, instance):
+        request = self.context.get('request')
+        instance = Recipe.objects.for_read(request.user).get(pk=instance.pk)
         return RecipeGetSerializer(
             instance,
-            context={'request': self.context.get('request')}).data
+            context={'request': request}).data
 
     def validate_tags(self, tags):
         if not tags:
             raise serializers.ValidationError('Выберите тег!')
         if len(tags) > len(set(tags)):
             raise serializers.ValidationError('Теги нельзя повторять!')
+        missing = set(tags) - Tag.objects.in_bulk(tags).keys()
+        if missing:
+            raise serializers.ValidationError(
+                'Теги с id {} не существуют!'.format(
+                    ', '.join(map(str, sorted(missing))))
+            )
         return tags
 
     def validate_ingredients(self, ingredients):
-        list_ingredients = []
         if not ingredients:
             raise serializers.ValidationError('Выберите ингредиенты!')
         for ingredient in ingredients:
@@ -240,9 +326,15 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Количество ингредиента должно быть больше 0!'
                 )
-            if ingredient['id'] in list_ingredients:
-                raise serializers.ValidationError(
-                    'Ингредиенты не должны повторяться!'
-                )
-            list_ingredients.append(ingredient['id'])
+        ids = {ingredient['id'] for ingredient in ingredients}
+        if len(ids) < len(ingredients):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться!'
+            )
+        missing = ids - Ingredient.objects.in_bulk(ids).keys()
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты с id {} не существуют!'.format(
+                    ', '.join(map(str, sorted(missing))))
+            )
         return ingredients
@@ -1,15 +1,147 @@
 import base64
+import binascii
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from django.db import IntegrityError, connection, models, transaction
+from PIL import Image, ImageFile
 from rest_framework import serializers
 
+from recipes.models import Recipe
+
+HEADER_CHUNK = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+thumbnail_executor = ThreadPoolExecutor(
+    max_workers=settings.THUMBNAIL_WORKERS,
+    thread_name_prefix='thumbnails'
+)
+
 
 class Base64ImageField(serializers.ImageField):
+    """Картинка в base64 с проверкой размера до полного декодирования.
+
+    Объём файла оценивается по длине строки, а размеры картинки
+    читаются из заголовка, для которого декодируется только начало
+    строки.
+    """
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             imgformat, imgstr = data.split(';base64,')
             extension = imgformat.split('/')[-1]
-            data = ContentFile(
-                base64.b64decode(imgstr), name='image.' + extension
-            )
+            self.validate_base64_image(imgstr)
+            try:
+                content = base64.b64decode(imgstr)
+            except binascii.Error:
+                raise serializers.ValidationError(
+                    'Некорректная строка base64.')
+            data = ContentFile(content, name='image.' + extension)
         return super().to_internal_value(data)
+
+    def validate_base64_image(self, imgstr):
+        if len(imgstr) * 3 // 4 > settings.MAX_IMAGE_SIZE:
+            raise serializers.ValidationError(
+                'Размер картинки не должен превышать {} МБ.'.format(
+                    settings.MAX_IMAGE_SIZE // (1024 * 1024)))
+        parser = ImageFile.Parser()
+        for start in range(0, len(imgstr), HEADER_CHUNK):
+            try:
+                parser.feed(base64.b64decode(
+                    imgstr[start:start + HEADER_CHUNK]))
+            except (binascii.Error, OSError):
+                raise serializers.ValidationError(
+                    'Загрузите корректное изображение.')
+            if parser.image is not None:
+                break
+        if parser.image is None:
+            raise serializers.ValidationError(
+                'Загрузите корректное изображение.')
+        if max(parser.image.size) > settings.MAX_IMAGE_DIMENSION:
+            raise serializers.ValidationError(
+                'Сторона картинки не должна превышать {} px.'.format(
+                    settings.MAX_IMAGE_DIMENSION))
+
+
+def get_thumbnail_name(image_name):
+    path = PurePosixPath(image_name)
+    extension = settings.THUMBNAIL_FORMAT.lower()
+    return str(path.parent / 'thumbnails' / f'{path.stem}.{extension}')
+
+
+def generate_thumbnail(recipe_id, image_name):
+    """Создаёт превью картинки рецепта и сохраняет его имя в модели."""
+    try:
+        storage = Recipe._meta.get_field('image').storage
+        with storage.open(image_name) as file, Image.open(file) as image:
+            image.thumbnail(settings.THUMBNAIL_SIZE)
+            if settings.THUMBNAIL_FORMAT.upper() == 'JPEG':
+                image = image.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, settings.THUMBNAIL_FORMAT,
+                       quality=settings.THUMBNAIL_QUALITY)
+        thumbnail_name = get_thumbnail_name(image_name)
+        if storage.exists(thumbnail_name):
+            storage.delete(thumbnail_name)
+        thumbnail_name = storage.save(
+            thumbnail_name, ContentFile(buffer.getvalue()))
+        Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+            thumbnail=thumbnail_name)
+    except Exception:
+        logger.exception('Не удалось создать превью для %s', image_name)
+
+
+def generate_thumbnail_in_worker(recipe_id, image_name):
+    try:
+        generate_thumbnail(recipe_id, image_name)
+    finally:
+        connection.close()
+
+
+def schedule_thumbnail(recipe):
+    """Ставит создание превью в очередь фоновых потоков."""
+    if settings.THUMBNAIL_ASYNC:
+        thumbnail_executor.submit(
+            generate_thumbnail_in_worker, recipe.pk, recipe.image.name)
+    else:
+        generate_thumbnail(recipe.pk, recipe.image.name)
+
+
+def create_unique(model, **fields):
+    """Создаёт запись или возвращает None, если такая уже есть.
+
+    Повтор определяется по уникальному ограничению в БД, поэтому
+    одновременные запросы не приводят к ошибке 500.
+    """
+    try:
+        with transaction.atomic():
+            return model.objects.create(**fields)
+    except IntegrityError as error:
+        if is_unique_violation(error, model):
+            return None
+        raise
+
+
+def is_unique_violation(error, model):
+    """IntegrityError вызвана одним из UniqueConstraint модели."""
+    constraints = [
+        constraint for constraint in model._meta.constraints
+        if isinstance(constraint, models.UniqueConstraint)
+    ]
+    diag = getattr(error.__cause__, 'diag', None)
+    if diag is not None:
+        return diag.constraint_name in {
+            constraint.name for constraint in constraints}
+    # SQLite сообщает не имя ограничения, а его столбцы.
+    table = model._meta.db_table
+    return str(error) in {
+        'UNIQUE constraint failed: ' + ', '.join(
+            f'{table}.{model._meta.get_field(name).column}'
+            for name in constraint.fields)
+        for constraint in constraints
+    }
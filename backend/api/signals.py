@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.db import transaction
+
+from api.cache import bump_version
+from api.services import get_thumbnail_name, schedule_thumbnail
+from recipes.models import Ingredient, Recipe, Tag
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_cached_responses(sender, **kwargs):
+    # До фиксации транзакции параллельный запрос построил бы кеш по
+    # старым строкам уже под новой версией.
+    transaction.on_commit(lambda: bump_version(sender))
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_thumbnail(sender, instance, **kwargs):
+    if not instance.image:
+        return
+    if instance.thumbnail.name == get_thumbnail_name(instance.image.name):
+        return
+    transaction.on_commit(lambda: schedule_thumbnail(instance))
+
+
+@receiver(connection_created)
+def set_session_timeouts(sender, connection, **kwargs):
+    """Таймауты сессии при работе через pgbouncer.
+
+    В режиме transaction SET остаётся на серверном соединении
+    pgbouncer. Команды управления выставляют нулевые таймауты, и
+    соединение после них обслуживает веб-запросы без таймаутов до
+    следующего подключения воркера; если это важно, таймауты лучше
+    задать роли веб-сервера через ALTER ROLE ... SET, а команды
+    запускать под другой ролью.
+    """
+    if not settings.DB_PGBOUNCER or connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.DB_SESSION_SETTINGS.items():
+            cursor.execute(f'SET {name} = %s', [value])
@@ -0,0 +1,750 @@
+import json
+import multiprocessing
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.conf import settings
+from django.db import connection, connections
+from django.test import (RequestFactory, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITestCase
+
+from api.cache import bump_version, get_version
+from api.filters import RecipeFilter
+from api.instrumentation import QueryBudgetExceeded
+from api.metrics import (Counter, Gauge, Histogram, Registry,
+                         mark_process_dead)
+from api.pagination import RecipesCursorPagination
+from recipes.counters import recount_recipes
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            Favorite, RecipeRanking, ShoppingCart, Tag)
+from users.models import Follow, User
+
+
+class RecipesTestCase(APITestCase):
+    """Автор, теги, ингредиенты и RECIPES_COUNT рецептов автора."""
+
+    RECIPES_COUNT = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        # Кеш общий для процессов и переживает тестовую базу.
+        cache.clear()
+        cls.author = User.objects.create(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов')
+        cls.tags = [Tag.objects.create(name=name)
+                    for name in (Tag.BREAKFAST, Tag.DINNER, Tag.SUPPER)]
+        cls.ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(10)
+        ])
+        cls.recipes = []
+        for number in range(cls.RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'рецепт {number}', text='текст',
+                cooking_time=10, image='recipes/images/recipe.png')
+            recipe.tags.set(cls.tags[:number % 3 + 1])
+            IngredientRecipe.objects.bulk_create([
+                IngredientRecipe(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[(number + shift) % 10],
+                    amount=shift + 1)
+                for shift in range(3)
+            ])
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client.force_authenticate(self.author)
+
+    def walk(self, url, link='next'):
+        """id рецептов всех страниц по ссылкам link и последний ответ."""
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            self.assertLessEqual(len(ids), self.RECIPES_COUNT, 'Повтор')
+            url = response.data[link]
+        return ids, response.data
+
+
+class RecipesCursorPaginationTest(RecipesTestCase):
+
+    def test_ranked_cursor_with_ties(self):
+        """Одинаковый рейтинг у большинства рецептов не зацикливает
+        курсор и не теряет рецепты ни вперёд, ни назад."""
+        RecipeRanking.objects.filter(
+            recipe__in=self.recipes[:3]).update(popularity=5)
+        url = reverse('api:recipes-list')
+        for ordering in ('popular', 'trending'):
+            with self.subTest(ordering=ordering):
+                ids, last = self.walk(
+                    f'{url}?cursor=&limit=3&ordering={ordering}')
+                self.assertEqual(len(ids), self.RECIPES_COUNT)
+                self.assertEqual(
+                    set(ids), {recipe.id for recipe in self.recipes})
+                back, _ = self.walk(last['previous'], 'previous')
+                self.assertEqual(len(back), len(set(back)))
+                self.assertEqual(
+                    set(back), set(ids[:-len(last['results'])]))
+
+    def test_search_with_cursor(self):
+        url = reverse('api:recipes-list')
+        response = self.client.get(url, {'cursor': '', 'search': 'рецепт'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.data)
+        response = self.client.get(url, {'cursor': '', 'search': ' '})
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse('api:recipes-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cookable_cursor_with_ties(self):
+        """Курсор подбора рецептов проходит рецепты с одинаковым
+        числом недостающих ингредиентов без повторов и пропусков."""
+        ingredients = self.ingredients[:5]
+        expected = set(Recipe.objects.filter(
+            recipe_ingredients__ingredient__in=ingredients
+        ).values_list('id', flat=True))
+        query = '&'.join(
+            f'ingredients={ingredient.id}' for ingredient in ingredients)
+        # Повторов больше offset_cutoff, как на полной базе.
+        with mock.patch.object(RecipesCursorPagination, 'offset_cutoff', 2):
+            ids, _ = self.walk(
+                f'{reverse("api:recipes-cookable")}?cursor=&limit=2&{query}')
+        self.assertEqual(len(ids), len(expected))
+        self.assertEqual(set(ids), expected)
+
+
+class IngredientSearchTest(RecipesTestCase):
+
+    def test_search_by_prefix(self):
+        response = self.client.get(
+            reverse('api:ingredients-list'), {'name': 'Ингредиент 1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data],
+            ['ингредиент 1'])
+
+    def test_detail_ignores_search(self):
+        ingredient = self.ingredients[0]
+        response = self.client.get(
+            reverse('api:ingredients-detail', args=[ingredient.id]),
+            {'name': 'нет такого'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], ingredient.id)
+
+    @override_settings(INGREDIENT_INDEX_MAX_AGE=0)
+    def test_index_expires(self):
+        """Изменение в обход сигналов видно после истечения индекса."""
+        url = reverse('api:ingredients-list')
+        self.client.get(url, {'name': 'ингредиент'})
+        Ingredient.objects.filter(pk=self.ingredients[0].pk).update(
+            name='соль')
+        response = self.client.get(url, {'name': 'соль'})
+        self.assertEqual(len(response.data), 1)
+
+
+class CacheVersionTest(RecipesTestCase):
+
+    def test_bump_after_commit(self):
+        """Версия меняется только после фиксации транзакции."""
+        version, _ = get_version(Tag)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Tag.objects.filter(pk=self.tags[0].pk).first().save()
+            self.assertEqual(get_version(Tag)[0], version)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(get_version(Tag)[0], version + 1)
+
+    def test_bumps_are_distinct(self):
+        version, _ = get_version(Ingredient)
+        bump_version(Ingredient)
+        bump_version(Ingredient)
+        self.assertEqual(get_version(Ingredient)[0], version + 2)
+
+    def test_bump_after_eviction(self):
+        cache.clear()
+        bump_version(Ingredient)
+        self.assertIsNotNone(get_version(Ingredient)[0])
+
+
+class ShoppingListTest(RecipesTestCase):
+
+    async def test_stream_under_asgi(self):
+        """Под ASGI список покупок отдаётся асинхронным итератором, а
+        не собирается целиком перед отправкой."""
+        token = await Token.objects.acreate(user=self.author)
+        await ShoppingCart.objects.abulk_create([
+            ShoppingCart(user=self.author, recipe=recipe)
+            for recipe in self.recipes[:2]
+        ])
+        response = await self.async_client.get(
+            reverse('api:recipes-download-shopping-cart'),
+            headers={'Authorization': f'Token {token.key}',
+                     'Accept': 'text/plain'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b''.join(
+            [chunk async for chunk in response.streaming_content])
+        lines = [line for line in content.decode().splitlines() if line]
+        # Заголовок и четыре ингредиента двух рецептов.
+        self.assertEqual(len(lines), 5)
+
+    def test_formats(self):
+        ShoppingCart.objects.create(user=self.author, recipe=self.recipes[0])
+        url = reverse('api:recipes-download-shopping-cart')
+        for file_format, streaming in (
+                ('txt', True), ('csv', True), ('pdf', False)):
+            with self.subTest(format=file_format):
+                response = self.client.get(url, {'format': file_format})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.streaming, streaming)
+                self.assertIn(f'shopping_list.{file_format}',
+                              response['Content-Disposition'])
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_json_and_errors(self):
+        ShoppingCart.objects.create(user=self.author, recipe=self.recipes[0])
+        url = reverse('api:recipes-download-shopping-cart')
+        response = self.client.get(url, {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+        response = self.client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('detail', response.json())
+        self.client.force_authenticate(None)
+        response = self.client.get(url, HTTP_ACCEPT='text/plain')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class BulkCartFavoriteTest(RecipesTestCase):
+
+    def assertCounters(self, model, field, recipes, value):
+        self.assertEqual(recount_recipes(), 0)
+        for recipe in recipes:
+            recipe.refresh_from_db()
+            self.assertEqual(getattr(recipe, field), value)
+        self.assertEqual(
+            model.objects.filter(
+                user=self.author, recipe__in=recipes).count(),
+            len(recipes) * value)
+
+    def test_missing_ids(self):
+        response = self.client.post(
+            reverse('api:recipes-favorite-bulk'),
+            {'recipes': [self.recipes[0].id, 999999, 999998]},
+            format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999998, 999999', str(response.data['recipes']))
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_repeated_add_and_delete(self):
+        """Повторы в запросе и повторные запросы не дублируют записи
+        и не сбивают счётчики."""
+        url = reverse('api:recipes-favorite-bulk')
+        first = self.recipes[:2]
+        ids = [recipe.id for recipe in first]
+        response = self.client.post(
+            url, {'recipes': ids + ids[:1]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 2)
+        response = self.client.post(
+            url, {'recipes': ids + [self.recipes[2].id]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertCounters(Favorite, 'favorites_count', self.recipes[:3], 1)
+        for _ in range(2):
+            response = self.client.delete(url, {'recipes': ids}, format='json')
+            self.assertEqual(response.status_code, 204)
+        self.assertCounters(Favorite, 'favorites_count', first, 0)
+        self.assertCounters(
+            Favorite, 'favorites_count', self.recipes[2:3], 1)
+
+    def test_delete_with_query_params(self):
+        url = reverse('api:recipes-shopping-cart-bulk')
+        recipes = self.recipes[:3]
+        self.client.post(
+            url, {'recipes': [recipe.id for recipe in recipes]},
+            format='json')
+        response = self.client.delete(
+            f'{url}?recipes={recipes[0].id}&recipes={recipes[1].id}')
+        self.assertEqual(response.status_code, 204)
+        self.assertCounters(
+            ShoppingCart, 'shopping_cart_count', recipes[:2], 0)
+        self.assertCounters(
+            ShoppingCart, 'shopping_cart_count', recipes[2:], 1)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_clear_shopping_cart(self):
+        recipes = self.recipes[:3]
+        self.client.post(
+            reverse('api:recipes-shopping-cart-bulk'),
+            {'recipes': [recipe.id for recipe in recipes]}, format='json')
+        self.assertCounters(
+            ShoppingCart, 'shopping_cart_count', recipes, 1)
+        for _ in range(2):
+            response = self.client.delete(
+                reverse('api:recipes-clear-shopping-cart'))
+            self.assertEqual(response.status_code, 204)
+        self.assertCounters(
+            ShoppingCart, 'shopping_cart_count', recipes, 0)
+
+
+class RecipeListQueriesTest(RecipesTestCase):
+
+    def test_user_flags_constant_queries(self):
+        """Отметки is_favorited и is_in_shopping_cart не добавляют
+        запросов на каждый рецепт страницы."""
+        Favorite.objects.bulk_create([
+            Favorite(user=self.author, recipe=recipe)
+            for recipe in self.recipes[::2]
+        ])
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user=self.author, recipe=recipe)
+            for recipe in self.recipes[::3]
+        ])
+        url = reverse('api:recipes-list')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'limit': 2})
+        self.assertEqual(len(response.data['results']), 2)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url, {'limit': 12})
+        results = response.data['results']
+        self.assertEqual(len(results), 12)
+        favorited = {recipe.id for recipe in self.recipes[::2]}
+        in_cart = {recipe.id for recipe in self.recipes[::3]}
+        for recipe in results:
+            self.assertEqual(recipe['is_favorited'], recipe['id'] in favorited)
+            self.assertEqual(
+                recipe['is_in_shopping_cart'], recipe['id'] in in_cart)
+
+
+class ViewTimingTest(RecipesTestCase):
+
+    def test_view_time_logged(self):
+        with self.assertLogs('api.instrumentation', 'INFO') as logs:
+            self.client.get(reverse('api:recipes-list'))
+        metrics = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(metrics['view'], 'api:recipes-list')
+        self.assertGreater(metrics['view_ms'], 0)
+        self.assertGreater(metrics['total_ms'], metrics['view_ms'])
+
+
+class QueryBudgetTest(RecipesTestCase):
+
+    def test_budget_enforced_in_tests(self):
+        self.assertTrue(settings.QUERY_BUDGET_ENFORCE)
+
+    def test_budget_exceeded(self):
+        url = reverse('api:tags-list')
+        with override_settings(QUERY_BUDGETS={'api:tags-list': 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(url)
+        with override_settings(QUERY_BUDGETS={
+                'api:tags-list': 0, 'GET api:tags-list': None}):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class SubscriptionsTest(RecipesTestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create(
+            email='reader@foodgram.ru', username='reader')
+        self.client.force_authenticate(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def follow_authors(self, recipes_counts):
+        """Подписывает читателя на новых авторов с заданным числом
+        рецептов и возвращает их."""
+        authors = []
+        for recipes_count in recipes_counts:
+            number = User.objects.count()
+            author = User.objects.create(
+                email=f'author{number}@foodgram.ru',
+                username=f'author{number}')
+            for index in range(recipes_count):
+                Recipe.objects.create(
+                    author=author, name=f'рецепт {number}-{index}',
+                    text='текст', cooking_time=10,
+                    image='recipes/images/recipe.png')
+            Follow.objects.create(user=self.reader, author=author)
+            authors.append(author)
+        return authors
+
+    def get_subscriptions(self, **params):
+        response = self.client.get(
+            reverse('api:users-subscriptions'),
+            {'limit': 10, 'recipes_limit': 3, **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_constant_queries(self):
+        """Число запросов не зависит от числа подписок на странице."""
+        self.follow_authors([1, 2])
+        with CaptureQueriesContext(connection) as queries:
+            self.get_subscriptions()
+        self.follow_authors([0, 3, 5, 4])
+        with self.assertNumQueries(len(queries)):
+            response = self.get_subscriptions()
+        self.assertEqual(len(response.data['results']), 7)
+
+    def test_previews_and_counts(self):
+        authors = [self.author, *self.follow_authors([0, 1, 5])]
+        results = {
+            row['id']: row
+            for row in self.get_subscriptions().data['results']
+        }
+        for author, recipes_count in zip(authors, (20, 0, 1, 5)):
+            with self.subTest(author=author.username):
+                row = results[author.id]
+                self.assertEqual(row['recipes_count'], recipes_count)
+                self.assertTrue(row['is_subscribed'])
+                self.assertEqual(
+                    len(row['recipes']), min(recipes_count, 3))
+                self.assertLessEqual(
+                    {recipe['id'] for recipe in row['recipes']},
+                    set(author.recipes.values_list('id', flat=True)))
+        response = self.get_subscriptions(recipes_limit='')
+        self.assertEqual(len(response.data['results'][0]['recipes']), 20)
+
+
+class RecipeUpdateQueriesTest(RecipesTestCase):
+
+    def get_data(self, recipe, **changes):
+        return {
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'tags': [tag.id for tag in recipe.tags.all()],
+            'ingredients': [
+                {'id': row.ingredient_id, 'amount': row.amount}
+                for row in recipe.recipe_ingredients.all()
+            ],
+            **changes,
+        }
+
+    def update(self, recipe, data):
+        response = self.client.patch(
+            reverse('api:recipes-detail', args=[recipe.id]), data,
+            format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unchanged_ingredients(self):
+        """Правка без изменения ингредиентов и тегов выполняет одно и то
+        же число запросов при любом числе ингредиентов и не пишет в
+        таблицы ингредиентов и тегов рецепта."""
+        small, large = self.recipes[:2]
+        IngredientRecipe.objects.bulk_create([
+            IngredientRecipe(recipe=large, ingredient=ingredient, amount=1)
+            for ingredient in self.ingredients[4:]
+        ])
+        data = self.get_data(small, name='новое название')
+        with CaptureQueriesContext(connection) as queries:
+            self.update(small, data)
+        for query in queries:
+            self.assertNotRegex(
+                query['sql'],
+                r'^(INSERT INTO|UPDATE|DELETE FROM) '
+                r'"recipes_(ingredientrecipe|recipe_tags)"')
+        data = self.get_data(large, name='другое название')
+        with self.assertNumQueries(len(queries)):
+            self.update(large, data)
+
+
+class RecipeFilterPaginationTest(RecipesTestCase):
+
+    def walk_pages(self, params):
+        ids = []
+        url = reverse('api:recipes-list')
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            count = response.data['count']
+            url, params = response.data['next'], None
+        return ids, count
+
+    def test_tags_without_duplicates(self):
+        """Рецепт с несколькими выбранными тегами попадает в выдачу
+        один раз, а count совпадает с числом рецептов на страницах."""
+        slugs = [tag.slug for tag in self.tags]
+        ids, count = self.walk_pages({'tags': slugs, 'limit': 4})
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(count, self.RECIPES_COUNT)
+        self.assertEqual(len(ids), count)
+
+    def test_favorited_in_cart_without_duplicates(self):
+        self.client.post(
+            reverse('api:recipes-favorite-bulk'),
+            {'recipes': [recipe.id for recipe in self.recipes[:9]]},
+            format='json')
+        self.client.post(
+            reverse('api:recipes-shopping-cart-bulk'),
+            {'recipes': [recipe.id for recipe in self.recipes[3:12]]},
+            format='json')
+        ids, count = self.walk_pages({
+            'is_favorited': 1, 'is_in_shopping_cart': 1,
+            'tags': [tag.slug for tag in self.tags], 'limit': 2})
+        self.assertEqual(
+            sorted(ids), sorted(recipe.id for recipe in self.recipes[3:9]))
+        self.assertEqual(count, 6)
+
+
+class QueryPlansTest(RecipesTestCase):
+    """Горячие запросы API читают основные таблицы по индексам."""
+
+    SEQ_SCAN_PATTERNS = {
+        'postgresql': r'Seq Scan on {table}\b',
+        'sqlite': r'SCAN {table}(?! USING)\b',
+    }
+
+    def filter_recipes(self, **params):
+        """Запрос списка рецептов с фильтрами RecipeFilter, как в API."""
+        request = RequestFactory().get('/api/recipes/', params)
+        request.user = self.author
+        filterset = RecipeFilter(
+            request.GET, queryset=Recipe.objects.all(), request=request)
+        self.assertTrue(filterset.is_valid(), filterset.errors)
+        return filterset.qs[:6]
+
+    def test_no_full_scans(self):
+        pattern = self.SEQ_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is None:
+            self.skipTest(f'СУБД {connection.vendor} не поддерживается')
+        if connection.vendor == 'postgresql':
+            # На маленьких тестовых таблицах Postgres выбирает Seq Scan
+            # при любых индексах; проверяется, что индекс применим.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        queries = {
+            'Лента рецептов': Recipe.objects.all()[:6],
+            'Рецепты автора': self.filter_recipes(author=self.author.id),
+            'Избранное': self.filter_recipes(is_favorited=1),
+            'Корзина': self.filter_recipes(is_in_shopping_cart=1),
+            'Фильтр по тегу': self.filter_recipes(tags=self.tags[0].slug),
+            'Подписки': Follow.objects.filter(user=self.author)[:6],
+        }
+        for title, queryset in queries.items():
+            with self.subTest(title):
+                plan = queryset.explain()
+                self.assertIsNone(re.search(pattern.format(
+                    table=queryset.model._meta.db_table), plan), plan)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Одновременные транзакции из потоков нужны Postgres')
+class ConcurrentTogglesTest(TransactionTestCase):
+    """Одновременные одинаковые запросы (двойной клик) из потоков."""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.user = User.objects.create(
+            email='user@foodgram.ru', username='user',
+            first_name='Имя', last_name='Фамилия')
+        self.author = User.objects.create(
+            email='author@foodgram.ru', username='author',
+            first_name='Автор', last_name='Рецептов')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='рецепт', text='текст',
+            cooking_time=10, image='recipes/images/recipe.png')
+
+    def request_concurrently(self, method, url):
+        barrier = Barrier(self.THREADS)
+
+        def request(_):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                return getattr(client, method)(url).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.THREADS) as executor:
+            return sorted(executor.map(request, range(self.THREADS)))
+
+    def test_favorite(self):
+        url = reverse('api:recipes-favorite', args=[self.recipe.id])
+        self.assertEqual(self.request_concurrently('post', url),
+                         [201] + [400] * (self.THREADS - 1))
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.request_concurrently('delete', url),
+                         [204] + [400] * (self.THREADS - 1))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_subscribe(self):
+        url = reverse('api:users-subscribe', args=[self.author.id])
+        self.assertEqual(self.request_concurrently('post', url),
+                         [200] + [400] * (self.THREADS - 1))
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        self.assertEqual(self.request_concurrently('delete', url),
+                         [204] + [400] * (self.THREADS - 1))
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+
+REPLICA = settings.DB_REPLICA_ALIAS
+
+
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтение с реплики при двух алиасах БД.
+
+    Реплика - второе соединение с той же тестовой базой (как TEST
+    MIRROR), запросы к каждому алиасу считаются отдельно. Алиас
+    добавляется после подготовки тестовой базы, поэтому его нет в
+    databases.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_added = REPLICA not in connections.settings
+        if cls.replica_added:
+            connections.settings[REPLICA] = {
+                **connections['default'].settings_dict}
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.replica_added:
+            connections[REPLICA].close()
+            del connections[REPLICA]
+            del connections.settings[REPLICA]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch(
+            'api.replicas.get_replica_alias', return_value=REPLICA)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create(
+            email='user@foodgram.ru', username='user',
+            first_name='Имя', last_name='Фамилия')
+        self.tag = Tag.objects.create(name=Tag.BREAKFAST)
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='рецепт', text='текст',
+            cooking_time=10, image='recipes/images/recipe.png')
+        self.recipe.tags.set([self.tag])
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def get(self, url, params=None, client=None):
+        """Ответ и SQL запросов к основной базе и к реплике."""
+        client = client or self.client
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return ([query['sql'] for query in primary],
+                [query['sql'] for query in replica])
+
+    def test_recipes_read_from_replica(self):
+        primary, replica = self.get(reverse('api:recipes-list'))
+        self.assertEqual(primary, [])
+        self.assertTrue(replica)
+
+    def test_cached_data_built_from_primary(self):
+        """Кешируемые под версией данные не читаются с реплики."""
+        for url, params in ((reverse('api:ingredients-list'), None),
+                            (reverse('api:ingredients-list'),
+                             {'name': 'со'}),
+                            (reverse('api:tags-list'), None)):
+            with self.subTest(url=url, params=params):
+                primary, replica = self.get(url, params)
+                self.assertEqual(replica, [])
+                self.assertTrue(primary)
+        primary, replica = self.get(
+            reverse('api:recipes-list'), {'tags': self.tag.slug})
+        self.assertTrue(any(
+            '"recipes_tag"."slug"' in sql for sql in primary))
+        self.assertFalse(any(
+            '"recipes_tag"."slug", "recipes_tag"."id"' in sql
+            for sql in replica))
+
+    def test_writer_pinned_to_primary(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            reverse('api:recipes-favorite', args=[self.recipe.id]))
+        self.assertEqual(response.status_code, 201)
+        _, replica = self.get(reverse('api:recipes-list'), client=client)
+        self.assertEqual(replica, [])
+        _, replica = self.get(reverse('api:recipes-list'))
+        self.assertTrue(replica)
+
+
+class MetricsTest(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('api.metrics.registry', Registry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(METRICS_DIR='')
+    def test_exposition_format(self):
+        counter = Counter('test_requests', 'Запросы.', ('path',))
+        histogram = Histogram('test_latency', 'Время.', buckets=(0.1, 1))
+        gauge = Gauge('test_connections', 'Соединения.')
+        counter.inc(path='/a"b\n')
+        counter.inc(2, path='/a"b\n')
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        gauge.set(3)
+        self.assertEqual(self.registry.render().splitlines(), [
+            '# HELP test_connections Соединения.',
+            '# TYPE test_connections gauge',
+            'test_connections 3',
+            '# HELP test_latency Время.',
+            '# TYPE test_latency histogram',
+            'test_latency_bucket{le="0.1"} 1',
+            'test_latency_bucket{le="1"} 2',
+            'test_latency_bucket{le="+Inf"} 3',
+            'test_latency_sum 5.55',
+            'test_latency_count 3',
+            '# HELP test_requests Запросы.',
+            '# TYPE test_requests counter',
+            'test_requests_total{path="/a\\"b\\n"} 3',
+        ])
+
+    def test_multiprocess_aggregation(self):
+        """/metrics суммирует файлы всех воркеров, а gauge
+        завершившегося воркера перестаёт учитываться."""
+        counter = Counter('test_toggles', 'Переключатели.')
+        gauge = Gauge('test_connections', 'Соединения.')
+
+        def worker():
+            counter.inc(2)
+            gauge.set(1)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory):
+            counter.inc()
+            gauge.set(1)
+            process = multiprocessing.get_context('fork').Process(
+                target=worker)
+            process.start()
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+            lines = self.registry.render().splitlines()
+            self.assertIn('test_toggles_total 3', lines)
+            self.assertIn('test_connections 2', lines)
+            mark_process_dead(process.pid)
+            lines = self.registry.render().splitlines()
+            self.assertIn('test_toggles_total 3', lines)
+            self.assertIn('test_connections 1', lines)
@@ -1,44 +1,103 @@
+from django.conf import settings
 from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import permissions, viewsets
+from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 
+from api.cache import CachedResponseMixin
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import RecipesPagination
+from api.instrumentation import ViewTimingMixin
+from api.metrics import SHOPPING_LIST_DOWNLOADS
+from api.pagination import (OptionalCursorPaginationMixin,
+                            RecipesCursorPagination, RecipesPagination)
+from api.renderers import (SHOPPING_LIST_RENDERERS, ShoppingListRenderer,
+                           stream_in_thread)
+from api.replicas import ReplicaReadMixin
 from api.permissions import IsAuthorOrAdminOrReadOnly
-from api.serializers import (FavoriteSerializer, IngredientSerializer,
-                             RecipeGetSerializer, RecipeWriteSerializer,
-                             ShoppingCartSerializer, TagSerializer)
-from api.mixins import AddOrDelCartFavoriteMixin
+from api.serializers import (CookableQuerySerializer,
+                             CookableRecipeSerializer, FavoriteSerializer,
+                             IngredientSerializer, RecipeGetSerializer,
+                             RecipeWriteSerializer, ShoppingCartSerializer,
+                             TagSerializer)
+from api.mixins import AddOrDelCartFavoriteMixin, AsyncReadMixin
+from recipes.counters import delete_counted
 from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
                             ShoppingCart, Tag)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ViewTimingMixin, CachedResponseMixin, AsyncReadMixin,
+                        viewsets.ReadOnlyModelViewSet):
+    # Ответы кешируются под версией данных и читаются с основной базы:
+    # отстающая реплика закешировала бы старые строки под новой версией.
+    cache_models = (Ingredient,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (IngredientFilter,)
     search_fields = ('^name',)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ViewTimingMixin, CachedResponseMixin, AsyncReadMixin,
+                 viewsets.ReadOnlyModelViewSet):
+    cache_models = (Tag,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
 
-class RecipeViewSet(viewsets.ModelViewSet, AddOrDelCartFavoriteMixin):
+class RecipeViewSet(ViewTimingMixin, ReplicaReadMixin, AsyncReadMixin,
+                    OptionalCursorPaginationMixin, viewsets.ModelViewSet,
+                    AddOrDelCartFavoriteMixin):
     queryset = Recipe.objects.all()
     pagination_class = RecipesPagination
+    cursor_pagination_class = RecipesCursorPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
 
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'cookable'):
+            return Recipe.objects.for_read(self.request.user)
+        return super().get_queryset()
+
     def get_serializer_class(self):
+        if self.action == 'cookable':
+            return CookableRecipeSerializer
         if self.action in ('list', 'retrieve'):
             return RecipeGetSerializer
         return RecipeWriteSerializer
 
+    def handle_exception(self, exc):
+        if self.action == 'download_shopping_cart':
+            # Ошибки отдаются в JSON, как и в остальном API, а не
+            # в формате запрошенного файла.
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return super().handle_exception(exc)
+
+    @action(detail=False, methods=['get'], url_path='cookable')
+    def cookable(self, request, *args, **kwargs):
+        """Рецепты, которые можно приготовить из переданных ингредиентов.
+
+        Сначала идут рецепты без недостающих ингредиентов, затем по
+        возрастанию их числа. Фильтры списка рецептов тоже работают.
+        """
+        query = CookableQuerySerializer(data={
+            **request.query_params.dict(),
+            'ingredients': request.query_params.getlist('ingredients'),
+        })
+        query.is_valid(raise_exception=True)
+        queryset = self.filter_queryset(self.get_queryset()).cookable_from(
+            query.validated_data['ingredients'])
+        if 'max_missing' in query.validated_data:
+            queryset = queryset.filter(
+                missing_ingredients__lte=query.validated_data['max_missing'])
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[permissions.IsAuthenticated])
     def favorite(self, request, *args, **kwargs):
@@ -57,29 +116,59 @@ class RecipeViewSet(viewsets.ModelViewSet, AddOrDelCartFavoriteMixin):
             ShoppingCartSerializer
         )
 
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=[permissions.IsAuthenticated],
+            url_path='favorite', url_name='favorite-bulk')
+    def favorite_bulk(self, request, *args, **kwargs):
+        return self.bulk_action_for_cart_or_favorite(
+            request,
+            Favorite,
+            FavoriteSerializer
+        )
+
+    @action(detail=False, methods=['post', 'delete'],
+            permission_classes=[permissions.IsAuthenticated],
+            url_path='shopping_cart', url_name='shopping-cart-bulk')
+    def shopping_cart_bulk(self, request, *args, **kwargs):
+        return self.bulk_action_for_cart_or_favorite(
+            request,
+            ShoppingCart,
+            ShoppingCartSerializer
+        )
+
+    @action(detail=False, methods=['delete'],
+            permission_classes=[permissions.IsAuthenticated],
+            url_path='shopping_cart/clear')
+    def clear_shopping_cart(self, request, *args, **kwargs):
+        delete_counted(ShoppingCart.objects.filter(user=request.user))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     @action(detail=False, methods=['get'],
-            permission_classes=[permissions.IsAuthenticated])
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request, *args, **kwargs):
         ingredients = IngredientRecipe.objects.filter(
             recipe_id__shopping_cart__user=self.request.user).values(
             'ingredient__name', 'ingredient__measurement_unit').annotate(
             amount_ingredients=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
+        renderer = request.accepted_renderer
+        SHOPPING_LIST_DOWNLOADS.inc(format=renderer.format)
+        if not isinstance(renderer, ShoppingListRenderer):
+            return Response(list(ingredients))
+        content = renderer.content(
+            ingredients.iterator(chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
         )
-        shopping_list = ['>>>СПИСОК НЕОБХОДИМЫХ ИНГРЕДИЕНТОВ<<<\n']
-        if not ingredients:
-            shopping_list.append('УПС! Ваш список пуст :(')
-        for index, ingredient in enumerate(ingredients, 1):
-            raw = [
-                str(index) + '.',
-                ingredient['ingredient__name'].title() + ' -',
-                str(ingredient['amount_ingredients']),
-                ingredient['ingredient__measurement_unit']
-            ]
-            shopping_list.append(' '.join(raw))
-        response = HttpResponse(
-            '\n'.join(shopping_list), content_type='text/plain'
-        )
+        if renderer.streaming:
+            if isinstance(request._request, ASGIRequest):
+                content = stream_in_thread(
+                    content, settings.SHOPPING_LIST_CHUNK_SIZE)
+            response = StreamingHttpResponse(
+                content, content_type=renderer.get_content_type())
+        else:
+            response = HttpResponse(
+                content, content_type=renderer.get_content_type())
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="{renderer.get_filename()}"'
         )
         return response
@@ -3,5 +3,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
+# Таймауты сессии БД только для веб-запросов, см. DB_SESSION_SETTINGS.
+os.environ.setdefault('DB_SESSION_TIMEOUTS', 'True')
 
 application = get_asgi_application()
@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -12,6 +13,8 @@ SECRET_KEY = os.getenv('SECRET_KEY', '123')
 
 DEBUG = os.getenv('DEBUG', default=False) == 'True'
 
+TESTING = 'test' in sys.argv[1:2]
+
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',')
 
 
@@ -32,6 +35,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.InstrumentationMiddleware',
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,6 +67,28 @@ TEMPLATES = [
 WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 
 
+# Время жизни соединения с БД в секундах: 0 - новое соединение на
+# каждый запрос, None - без ограничения.
+DB_CONN_MAX_AGE = os.getenv('DB_CONN_MAX_AGE', '60')
+# Режим для pgbouncer с pool_mode=transaction: серверные курсоры
+# отключаются, а таймауты выставляются командой SET после
+# подключения, так как pgbouncer не принимает параметр options.
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'False') == 'True'
+# Таймауты сессии Postgres в миллисекундах, 0 - без ограничения.
+# Действуют только в процессах веб-сервера: wsgi.py и asgi.py
+# выставляют DB_SESSION_TIMEOUTS=True. Команды управления (migrate,
+# rebuild_search_index, recount_counters, refresh_rankings --full)
+# работают без таймаутов.
+DB_SESSION_TIMEOUTS = os.getenv('DB_SESSION_TIMEOUTS', 'False') == 'True'
+DB_SESSION_SETTINGS = {
+    'statement_timeout': int(os.getenv('DB_STATEMENT_TIMEOUT', 30000)),
+    'lock_timeout': int(os.getenv('DB_LOCK_TIMEOUT', 10000)),
+    'idle_in_transaction_session_timeout': int(
+        os.getenv('DB_IDLE_IN_TRANSACTION_TIMEOUT', 60000)),
+}
+if not DB_SESSION_TIMEOUTS:
+    DB_SESSION_SETTINGS = dict.fromkeys(DB_SESSION_SETTINGS, 0)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -69,10 +96,61 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': (
+            None if DB_CONN_MAX_AGE == 'None' else int(DB_CONN_MAX_AGE)
+        ),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+        ),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+        },
+    }
+}
+if not DB_PGBOUNCER:
+    DATABASES['default']['OPTIONS']['options'] = ' '.join(
+        f'-c {name}={value}' for name, value in DB_SESSION_SETTINGS.items()
+    )
+
+# Реплика для чтения безопасных запросов API (api.replicas). Если
+# DB_REPLICA_HOST не задан и алиаса нет в DATABASES, всё читается из
+# основной базы.
+DB_REPLICA_ALIAS = os.getenv('DB_REPLICA_ALIAS', 'replica')
+# Сколько секунд после изменения данных пользователь читает с основной
+# базы, чтобы видеть свои изменения.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES[DB_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# Кеш должен быть общим для воркеров и команд управления: через него
+# bd_load и generate_data сбрасывают закешированные ответы. LocMemCache
+# живёт в памяти одного процесса, поэтому по умолчанию кеш хранится в
+# файлах; для нескольких серверов нужен Redis или Memcached.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram-cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
     }
 }
 
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', 60 * 60 * 24))
+# Наибольший возраст индекса названий ингредиентов в памяти воркера.
+INGREDIENT_INDEX_MAX_AGE = int(os.getenv('INGREDIENT_INDEX_MAX_AGE', 300))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -105,6 +183,17 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', 5 * 1024 * 1024))
+MAX_IMAGE_DIMENSION = int(os.getenv('MAX_IMAGE_DIMENSION', 4096))
+THUMBNAIL_SIZE = (
+    int(os.getenv('THUMBNAIL_WIDTH', 480)),
+    int(os.getenv('THUMBNAIL_HEIGHT', 480)),
+)
+THUMBNAIL_FORMAT = os.getenv('THUMBNAIL_FORMAT', 'WEBP')
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', 80))
+THUMBNAIL_ASYNC = os.getenv('THUMBNAIL_ASYNC', 'True') == 'True'
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -134,4 +223,68 @@ DJOSER = {
     },
 }
 
+SHOPPING_LIST_CHUNK_SIZE = int(os.getenv('SHOPPING_LIST_CHUNK_SIZE', 2000))
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+TRENDING_DAYS = int(os.getenv('TRENDING_DAYS', 7))
+
+INSTRUMENTATION = os.getenv('INSTRUMENTATION', 'True') == 'True'
+# Заголовок Server-Timing раскрывает клиенту число запросов и время БД,
+# поэтому по умолчанию отдаётся только при DEBUG; лог пишется всегда.
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)) == 'True'
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 100))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv('SLOW_QUERY_SAMPLE_RATE', 0.1))
+# В тестах превышение бюджета запросов - ошибка, а не строка в логе.
+QUERY_BUDGET_ENFORCE = os.getenv(
+    'QUERY_BUDGET_ENFORCE', str(TESTING)) == 'True'
+QUERY_BUDGETS = {
+    'api:recipes-list': 6,
+    'POST api:recipes-list': 20,
+    'api:recipes-detail': 5,
+    'PATCH api:recipes-detail': 24,
+    'DELETE api:recipes-detail': None,
+    'api:recipes-cookable': 6,
+    'api:recipes-favorite': 6,
+    'api:recipes-shopping-cart': 6,
+    'api:recipes-download-shopping-cart': 2,
+    'api:users-list': 3,
+    'api:users-detail': 3,
+    'api:users-me': 2,
+    'DELETE api:users-me': None,
+    'api:users-subscriptions': 4,
+    'api:users-subscribe': 7,
+    'api:ingredients-list': 2,
+    'api:tags-list': 2,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.instrumentation': {
+            'handlers': ['console'],
+            # Строка на каждый запрос не нужна в выводе тестов.
+            'level': os.getenv(
+                'INSTRUMENTATION_LOG_LEVEL',
+                'WARNING' if TESTING else 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Асинхронные представления чтения; включается в режиме ASGI.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# Каталог файлов метрик воркеров gunicorn; пусто - метрики в памяти.
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
 CSRF_TRUSTED_ORIGINS = ['https://foodgram41.ddns.net']
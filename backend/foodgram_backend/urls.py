@@ -3,12 +3,18 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import include, path
 
+from api.metrics import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls', namespace='api')),
 ]
 
+if settings.METRICS_ENABLED:
+    # Не проксируется nginx: доступен только из внутренней сети.
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))
+
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
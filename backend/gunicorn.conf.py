@@ -0,0 +1,28 @@
+"""Настройки gunicorn; файл подхватывается из рабочего каталога."""
+import os
+import shutil
+
+os.environ.setdefault('METRICS_DIR', '/tmp/foodgram-metrics')
+
+# ASGI=True: uvicorn-воркеры и асинхронные представления чтения.
+if os.getenv('ASGI', 'False') == 'True':
+    wsgi_app = 'foodgram_backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    os.environ.setdefault('ASYNC_VIEWS', 'True')
+    # Под ASGI каждый запрос выполняется в своём потоке, и постоянные
+    # соединения с БД не переиспользуются; для пула нужен pgbouncer.
+    os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+else:
+    wsgi_app = 'foodgram_backend.wsgi'
+
+
+def on_starting(server):
+    """Метрики прошлого запуска сервера не учитываются."""
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['METRICS_DIR'])
+
+
+def child_exit(server, worker):
+    from api.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
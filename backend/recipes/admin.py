@@ -1,11 +1,23 @@
 from django.contrib import admin
 
+from recipes.counters import delete_counted
 from recipes.models import (Favorite, Ingredient, IngredientRecipe,
                             Recipe, ShoppingCart, Tag)
 
 admin.site.site_header = '"FOODGRAM" | Администрирование'
 
 
+class CountedRelationAdmin(admin.ModelAdmin):
+    """Удаление избранного, корзины и подписок с уменьшением
+    счётчиков по фактически удалённым строкам."""
+
+    def delete_model(self, request, obj):
+        delete_counted(type(obj).objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        delete_counted(queryset)
+
+
 class IngredientsInline(admin.TabularInline):
     model = IngredientRecipe
     extra = 5
@@ -35,9 +47,10 @@ class RecipeAdmin(admin.ModelAdmin):
     filter_horizontal = ('tags',)
     empty_value_display = '-пусто-'
     inlines = (IngredientsInline,)
+    list_select_related = ('author',)
 
     def amount_favorites(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
     amount_favorites.short_description = 'Количество добавлений в избранное'
 
 
@@ -53,7 +66,7 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(CountedRelationAdmin):
     list_display = (
         'user',
         'recipe',
@@ -62,7 +75,7 @@ class FavoriteAdmin(admin.ModelAdmin):
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(CountedRelationAdmin):
     list_display = (
         'user',
         'recipe',
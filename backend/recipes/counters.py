@@ -0,0 +1,102 @@
+from collections import Counter
+
+from django.db import connections, router, transaction
+from django.db.models import Case, F, OuterRef, Q, Value, When
+from django.db.models.functions import Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingCart, count_of
+from users.models import Follow, User
+
+
+RECIPE_COUNTERS = {
+    'favorites_count': (Favorite, 'recipe'),
+    'shopping_cart_count': (ShoppingCart, 'recipe'),
+}
+USER_COUNTERS = {
+    'recipes_count': (Recipe, 'author'),
+    'followers_count': (Follow, 'author'),
+}
+# Связь: (поле ссылки, модель со счётчиком, счётчик).
+COUNTED_RELATIONS = {
+    Favorite: ('recipe', Recipe, 'favorites_count'),
+    ShoppingCart: ('recipe', Recipe, 'shopping_cart_count'),
+    Follow: ('author', User, 'followers_count'),
+}
+
+
+def recount(queryset, counters):
+    """Пересчитывает счётчики одним UPDATE и возвращает число
+    строк, в которых значения расходились с фактическими."""
+    expressions = {
+        name: count_of(
+            model.objects.filter(**{field: OuterRef('pk')}), field)
+        for name, (model, field) in counters.items()
+    }
+    drift = Q()
+    for name in counters:
+        drift |= ~Q(**{name: expressions[name]})
+    drifted = queryset.filter(drift).count()
+    if drifted:
+        queryset.update(**expressions)
+    return drifted
+
+
+def recount_recipes(recipe_ids=None):
+    queryset = Recipe.objects.all()
+    if recipe_ids is not None:
+        queryset = queryset.filter(pk__in=recipe_ids)
+    return recount(queryset, RECIPE_COUNTERS)
+
+
+def recount_users(user_ids=None):
+    queryset = User.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(pk__in=user_ids)
+    return recount(queryset, USER_COUNTERS)
+
+
+def delete_returning(queryset, field):
+    """Удаляет строки queryset одним DELETE ... RETURNING и возвращает
+    значения field удалённых строк.
+
+    Строку, которую одновременно удалил другой запрос, DELETE не
+    вернёт, поэтому по результату счётчики поправляются точно.
+    """
+    model = queryset.model
+    db = router.db_for_write(model)
+    connection = connections[db]
+    quote = connection.ops.quote_name
+    subquery, params = queryset.values('pk').query.get_compiler(
+        db).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.pk.column)} IN ({subquery}) '
+            f'RETURNING {quote(model._meta.get_field(field).column)}',
+            params
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def decrement(model, field, ids):
+    """Одним UPDATE уменьшает счётчик field каждой строки на число
+    её вхождений в ids, но не ниже нуля."""
+    counts = Counter(ids)
+    if not counts:
+        return
+    delta = Case(
+        *[When(pk=pk, then=Value(count)) for pk, count in counts.items()],
+        default=Value(0)
+    )
+    model.objects.filter(pk__in=counts).update(
+        **{field: Greatest(F(field) - delta, Value(0))})
+
+
+def delete_counted(queryset):
+    """Удаляет избранное, корзину или подписки и уменьшает счётчики
+    на число действительно удалённых строк. Возвращает это число."""
+    field, target, counter = COUNTED_RELATIONS[queryset.model]
+    with transaction.atomic(using=router.db_for_write(queryset.model)):
+        ids = delete_returning(queryset, field)
+        decrement(target, counter, ids)
+    return len(ids)
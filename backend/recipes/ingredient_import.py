@@ -0,0 +1,167 @@
+"""Потоковый импорт ингредиентов из CSV и JSON.
+
+Файл читается построчно (CSV) или поэлементно (JSON), ингредиенты
+записываются пачками. Ключ ингредиента - пара (name,
+measurement_unit), поэтому повторный импорт того же каталога
+ничего не меняет.
+"""
+import csv
+import json
+import re
+from dataclasses import dataclass, field
+
+from recipes.models import Ingredient
+
+FIELDS = ('name', 'measurement_unit')
+JSON_CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+SCALAR_END = re.compile(r'[ \t\n\r,\]]')
+
+
+class JSONArrayReader:
+    """Итератор по элементам JSON-массива, читающий файл частями."""
+
+    def __init__(self, file, chunk_size=JSON_CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+
+    def read_more(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def next_char(self):
+        while True:
+            self.position = WHITESPACE.match(
+                self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                raise ValueError('неожиданный конец JSON-файла')
+
+    def decode(self):
+        if self.next_char() not in '{["':
+            # Число или литерал: дочитываем до разделителя, чтобы
+            # не разобрать значение, оборванное на границе куска.
+            while (not SCALAR_END.search(self.buffer, self.position)
+                   and self.read_more()):
+                pass
+        while True:
+            try:
+                item, end = self.decoder.raw_decode(
+                    self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.read_more():
+                    continue
+                raise
+            self.position = end
+            return item
+
+    def __iter__(self):
+        if self.next_char() != '[':
+            raise ValueError('ожидается JSON-массив')
+        self.position += 1
+        if self.next_char() == ']':
+            return
+        while True:
+            yield self.decode()
+            char = self.next_char()
+            self.position += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f'неожиданный символ {char!r} в JSON')
+
+
+def read_csv(file):
+    """Строки CSV вида "название,единица"; заголовок необязателен."""
+    for number, row in enumerate(csv.reader(file), 1):
+        if number == 1 and tuple(row) == FIELDS:
+            continue
+        yield number, row
+
+
+def read_json(file):
+    """Элементы массива [{"name": ..., "measurement_unit": ...}]."""
+    for number, item in enumerate(JSONArrayReader(file), 1):
+        if isinstance(item, dict):
+            item = [item.get(name) for name in FIELDS]
+        yield number, item
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def clean_row(row):
+    if not isinstance(row, (list, tuple)) or len(row) != len(FIELDS):
+        raise ValueError('ожидаются название и единица измерения')
+    values = []
+    for name, value in zip(FIELDS, row):
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f'поле {name} пустое')
+        max_length = Ingredient._meta.get_field(name).max_length
+        if len(value.strip()) > max_length:
+            raise ValueError(f'поле {name} длиннее {max_length} символов')
+        values.append(value.strip())
+    return tuple(values)
+
+
+@dataclass
+class ImportStats:
+    inserted: int = 0
+    existing: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+
+
+def import_ingredients(rows, stats, batch_size=1000):
+    """Загружает ингредиенты из rows - пар (номер строки, значения).
+
+    Новые ингредиенты добавляются, уже существующие учитываются в
+    stats.existing, ошибочные строки и повторы внутри файла - в
+    stats.skipped (ошибки с номерами строк - в stats.errors).
+    """
+    seen = set()
+    batch = []
+    for number, row in rows:
+        try:
+            ingredient = clean_row(row)
+        except ValueError as error:
+            stats.skipped += 1
+            stats.errors.append(f'Строка {number}: {error}')
+            continue
+        if ingredient in seen:
+            stats.skipped += 1
+            continue
+        seen.add(ingredient)
+        batch.append(ingredient)
+        if len(batch) == batch_size:
+            save_batch(batch, stats)
+            batch = []
+    if batch:
+        save_batch(batch, stats)
+    return stats
+
+
+def save_batch(batch, stats):
+    existing = set(Ingredient.objects.filter(
+        name__in={name for name, _ in batch}
+    ).values_list(*FIELDS))
+    new = [ingredient for ingredient in batch if ingredient not in existing]
+    # Конфликты возможны только при параллельном импорте: ключ
+    # покрывает все поля ингредиента, обновлять в них нечего.
+    Ingredient.objects.bulk_create(
+        [Ingredient(**dict(zip(FIELDS, ingredient))) for ingredient in new],
+        ignore_conflicts=True
+    )
+    stats.inserted += len(new)
+    stats.existing += len(batch) - len(new)
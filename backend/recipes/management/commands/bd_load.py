@@ -1,35 +1,60 @@
-import json
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from api.cache import bump_version
+from recipes.ingredient_import import READERS, ImportStats, import_ingredients
 from recipes.models import Ingredient
 from foodgram_backend.settings import BASE_DIR
 
+MAX_REPORTED_ERRORS = 20
+
 
 class Command(BaseCommand):
-    help = 'Команда для заполнение базы данных ингредиентами.'
+    help = ('Команда для заполнение базы данных ингредиентами из CSV '
+            'или JSON. Повторный запуск безопасен: уже загруженные '
+            'ингредиенты пропускаются.')
 
-    def handle(self, *args, **options):
-        self.ingredients(self, *args)
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=BASE_DIR / 'data/ingredients.json',
+            help='Путь к файлу ингредиентов.'
+        )
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Формат файла (по умолчанию - по расширению).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество ингредиентов в одной пачке.'
+        )
 
-    def ingredients(self, *args):
-        with open(
-            BASE_DIR / 'data/ingredients.json', 'r', encoding='utf-8'
-        ) as file:
-            try:
-                data = json.load(file)
-                for index, row in enumerate(data):
-                    data[index]['id'] = index
-                records = [Ingredient(**row) for row in data]
-                Ingredient.objects.bulk_create(records)
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        'База успешно заполнена ингредиентами'
-                    )
-                )
-            except Exception as error:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'Ошибка {error} при записи в базу данных'
-                    )
-                )
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла {path}, укажите --format')
+        stats = ImportStats()
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as file:
+                import_ingredients(
+                    READERS[file_format](file), stats,
+                    options['batch_size'])
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        except ValueError as error:
+            raise CommandError(f'Ошибка в файле {path}: {error}')
+        finally:
+            if stats.inserted:
+                bump_version(Ingredient)
+            for error in stats.errors[:MAX_REPORTED_ERRORS]:
+                self.stderr.write(error)
+            if len(stats.errors) > MAX_REPORTED_ERRORS:
+                self.stderr.write(
+                    f'... и ещё {len(stats.errors) - MAX_REPORTED_ERRORS}')
+            self.stdout.write(
+                f'Добавлено: {stats.inserted}, уже в базе: '
+                f'{stats.existing}, пропущено: {stats.skipped}')
+        self.stdout.write(self.style.SUCCESS(
+            'База успешно заполнена ингредиентами'))
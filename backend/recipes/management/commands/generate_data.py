@@ -0,0 +1,91 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import bump_version
+from recipes.counters import recount_recipes, recount_users
+from recipes.models import Ingredient, Tag
+from recipes.rankings import refresh_rankings
+from recipes.search import update_search_index
+from recipes.synthetic import SYNTHETIC_PASSWORD, SyntheticData
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетических пользователей, рецептов, подписок, '
+            'избранного и корзин для замеров производительности. '
+            'Ингредиенты должны быть загружены заранее (bd_load).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Количество пользователей.'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=10_000,
+            help='Количество рецептов.'
+        )
+        parser.add_argument(
+            '--authors', type=float, default=0.2,
+            help='Доля пользователей, публикующих рецепты.'
+        )
+        parser.add_argument(
+            '--follows', type=float, default=10,
+            help='Среднее количество подписок на пользователя.'
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее количество рецептов в избранном.'
+        )
+        parser.add_argument(
+            '--cart', type=float, default=5,
+            help='Среднее количество рецептов в корзине.'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора случайных чисел.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Размер пачки bulk_create.'
+        )
+
+    def handle(self, *args, **options):
+        ingredients = list(Ingredient.objects.order_by('id').values_list(
+            'id', 'name'))
+        if not ingredients:
+            raise CommandError(
+                'Ингредиентов нет: сначала выполните bd_load')
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        data = SyntheticData(options['seed'], options['batch_size'])
+        with transaction.atomic():
+            tag_ids = self.step('Теги', data.create_tags)
+            transaction.on_commit(lambda: bump_version(Tag))
+            user_ids = self.step(
+                'Пользователи', data.create_users, options['users'])
+            author_ids = user_ids[
+                :max(1, int(len(user_ids) * options['authors']))]
+            recipe_ids = self.step(
+                'Рецепты', data.create_recipes, options['recipes'],
+                author_ids, ingredients, tag_ids)
+            self.step('Подписки', data.create_follows, user_ids,
+                      author_ids, options['follows'])
+            self.step('Избранное', data.create_favorites, user_ids,
+                      recipe_ids, options['favorites'])
+            self.step('Корзины', data.create_shopping_carts, user_ids,
+                      recipe_ids, options['cart'])
+            self.step('Счётчики', lambda: (
+                recount_recipes(), recount_users()))
+            self.step('Рейтинги', refresh_rankings)
+            self.step('Поисковый индекс', update_search_index)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Пароль всех пользователей: {SYNTHETIC_PASSWORD}'))
+
+    def step(self, title, function, *args):
+        start = perf_counter()
+        result = function(*args)
+        count = f' ({len(result)})' if isinstance(result, list) else ''
+        self.stdout.write(
+            f'{title}{count}: {perf_counter() - start:.1f}s')
+        return result
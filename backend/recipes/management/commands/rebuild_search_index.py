@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = ('Полная перестройка поискового индекса рецептов, например '
+            'после массовой загрузки или переименования ингредиентов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одной пачке (SQLite).'
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        update_search_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount_recipes, recount_users
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт счётчиков избранного, корзины, рецептов '
+            'и подписчиков с исправлением расхождений.')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipes = recount_recipes()
+        users = recount_users()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {recipes}, пользователей: {users}'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.rankings import (get_last_refresh, get_stale_recipe_ids,
+                              refresh_rankings)
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт рейтингов популярности рецептов. По умолчанию '
+            'пересчитываются только рецепты, изменившиеся с прошлого '
+            'запуска; команду следует запускать по расписанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать рейтинги всех рецептов.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одной пачке.'
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids = None
+        last_refresh = get_last_refresh()
+        if not options['full'] and last_refresh is not None:
+            recipe_ids = get_stale_recipe_ids(last_refresh, timezone.now())
+        refreshed = refresh_rankings(recipe_ids, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рейтингов: {refreshed}'))
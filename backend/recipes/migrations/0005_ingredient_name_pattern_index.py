@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEX_NAME = 'ingredient_upper_name_like_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+    """Индекс для поиска ингредиентов по префиксу (name__istartswith).
+
+    Django строит такой поиск как UPPER(name::text) LIKE UPPER('x%'),
+    для которого в Postgres нужен функциональный индекс с
+    text_pattern_ops. В остальных СУБД миграция ничего не делает.
+    """
+
+    dependencies = [
+        ('recipes', '0004_recipe_ordering_and_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
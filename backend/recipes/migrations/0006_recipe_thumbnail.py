@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_ingredient_name_pattern_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='thumbnail',
+            field=models.ImageField(blank=True, default=None, editable=False, null=True, upload_to='recipes/images/thumbnails/', verbose_name='Превью картинки'),
+        ),
+    ]
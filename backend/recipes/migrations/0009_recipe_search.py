@@ -0,0 +1,75 @@
+# Generated by Django 4.2.3 on 2026-10-18 18:51
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+INDEX_NAME = 'recipe_search_vector_idx'
+FTS_TABLE = 'recipes_recipe_fts'
+INGREDIENT_NAMES = (
+    '(SELECT {aggregate} FROM recipes_ingredientrecipe ir '
+    'JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+    'WHERE ir.recipe_id = r.id)'
+)
+
+
+def fold_yo(column):
+    return f"REPLACE(REPLACE({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+            'ON recipes_recipe USING GIN (search_vector)'
+        )
+        names = INGREDIENT_NAMES.format(aggregate="string_agg(i.name, ' ')")
+        schema_editor.execute(
+            'UPDATE recipes_recipe r SET search_vector = '
+            "setweight(to_tsvector('russian', r.name), 'A') || "
+            f"setweight(to_tsvector('russian', COALESCE({names}, '')), 'B')"
+            " || setweight(to_tsvector('russian', r.text), 'C')"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            "name, ingredients, text, tokenize='unicode61 remove_diacritics 2')"
+        )
+        names = INGREDIENT_NAMES.format(aggregate="group_concat(i.name, ' ')")
+        names = f"COALESCE({names}, '')"
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+            f"SELECT r.id, {fold_yo('r.name')}, "
+            f"{fold_yo(names)}, "
+            f"{fold_yo('r.text')} "
+            'FROM recipes_recipe r'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+    """Полнотекстовый поиск рецептов.
+
+    В Postgres заполняется столбец search_vector и строится
+    GIN-индекс по нему, в SQLite создаётся таблица FTS5.
+    """
+
+    dependencies = [
+        ('recipes', '0008_recipe_ranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.3 on 2026-10-18 18:59
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """Сливает повторяющиеся ингредиенты в один с наименьшим id."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit').annotate(
+        keep=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        extra = Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep'])
+        recipes = set(IngredientRecipe.objects.filter(
+            ingredient_id=group['keep']).values_list('recipe_id', flat=True))
+        for link in IngredientRecipe.objects.filter(
+                ingredient__in=extra).order_by('id'):
+            if link.recipe_id in recipes:
+                link.delete()
+                continue
+            recipes.add(link.recipe_id)
+            link.ingredient_id = group['keep']
+            link.save(update_fields=['ingredient'])
+        extra.delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Отложенные проверки внешних ключей иначе не дадут изменить
+        # таблицу в той же транзакции (pending trigger events).
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEX_NAME = 'ingredient_upper_name_like_idx'
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)'
+    )
+
+
+class Migration(migrations.Migration):
+    """Удаляет индекс из 0005_ingredient_name_pattern_index.
+
+    Поиск ингредиентов по префиксу идёт по индексу в памяти
+    (api.ingredient_index), запросов name__istartswith к БД в API
+    больше нет, а индекс замедляет запись в таблицу ингредиентов.
+    """
+
+    dependencies = [
+        ('recipes', '0010_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_index, create_index),
+    ]
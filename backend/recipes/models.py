@@ -1,8 +1,13 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.core.validators import MinValueValidator
 
 from users.models import User
 
+COOKABLE_ORDERING = ('missing_ingredients', '-matched_ingredients',
+                     '-pub_date', '-id')
+
 
 class Tag(models.Model):
     """Тег."""
@@ -67,11 +72,83 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+def count_of(links, field):
+    """Подзапрос: количество строк links, ссылающихся полем field на
+    текущую строку (links отфильтрованы по OuterRef('pk'))."""
+    return Coalesce(
+        models.Subquery(
+            links.order_by().values(field)
+            .annotate(total=models.Count('pk')).values('total'),
+            output_field=models.IntegerField()
+        ),
+        0
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        """Аннотирует флаги избранного и корзины для пользователя."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    user=user, recipe=models.OuterRef('pk'))
+            ),
+            is_in_shopping_cart=models.Exists(
+                ShoppingCart.objects.filter(
+                    user=user, recipe=models.OuterRef('pk'))
+            ),
+        )
+
+    def for_read(self, user):
+        """Queryset для выдачи рецептов без N+1 запросов."""
+        return self.with_user_flags(user).prefetch_related(
+            models.Prefetch(
+                'author', queryset=User.objects.with_is_subscribed(user)
+            ),
+            'tags',
+            models.Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient')
+            ),
+        )
+
+    def cookable_from(self, ingredient_ids):
+        """Рецепты, в которых есть хотя бы один из ингредиентов.
+
+        Аннотирует количество совпавших и недостающих ингредиентов и
+        сортирует так, что полностью доступные рецепты идут первыми.
+        Кандидаты выбираются по индексу ингредиента, оба счётчика
+        считаются подзапросами по индексу (recipe, ingredient) только
+        для кандидатов.
+        """
+        links = IngredientRecipe.objects.filter(recipe=models.OuterRef('pk'))
+        matched = links.filter(ingredient_id__in=ingredient_ids)
+        missing = links.exclude(ingredient_id__in=ingredient_ids)
+        candidates = IngredientRecipe.objects.filter(
+            ingredient_id__in=ingredient_ids).values('recipe_id')
+        return self.filter(pk__in=candidates).annotate(
+            matched_ingredients=count_of(matched, 'recipe'),
+            missing_ingredients=count_of(missing, 'recipe'),
+        ).order_by(*COOKABLE_ORDERING)
+
+
 class Recipe(models.Model):
     """Рецепт."""
 
@@ -91,6 +168,14 @@ class Recipe(models.Model):
         null=True,
         default=None,
     )
+    thumbnail = models.ImageField(
+        upload_to='recipes/images/thumbnails/',
+        null=True,
+        blank=True,
+        default=None,
+        editable=False,
+        verbose_name='Превью картинки',
+    )
     text = models.TextField(
         verbose_name='Описание рецепта',
     )
@@ -114,10 +199,36 @@ class Recipe(models.Model):
         verbose_name='Дата публикации рецепта',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество добавлений в избранное',
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество добавлений в корзину',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -168,6 +279,11 @@ class Favorite(models.Model):
         related_name='favorite',
         verbose_name='Рецепт в спике избранных',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         verbose_name = 'Рецепт в списке избранных'
@@ -198,6 +314,11 @@ class ShoppingCart(models.Model):
         related_name='shopping_cart',
         verbose_name='Рецепт в корзине',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         verbose_name = 'Рецепт в корзине'
@@ -210,3 +331,47 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return self.recipe.name
+
+
+class RecipeRanking(models.Model):
+    """Рейтинг рецепта для сортировки по популярности.
+
+    Пересчитывается командой refresh_rankings вне запросов к API.
+    Пустое updated означает, что строка ещё ни разу не пересчитывалась.
+    """
+
+    recipe = models.OneToOneField(
+        'Recipe',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт',
+    )
+    popularity = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Популярность',
+    )
+    trending = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Популярность за последние дни',
+    )
+    updated = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Дата пересчёта',
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(
+                fields=['-popularity', '-recipe'],
+                name='ranking_popularity_idx'),
+            models.Index(
+                fields=['-trending', '-recipe'],
+                name='ranking_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.popularity}/{self.trending}'
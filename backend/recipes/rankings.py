@@ -0,0 +1,91 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe, RecipeRanking, ShoppingCart
+
+RANKING_EVENTS = (Favorite, ShoppingCart)
+
+
+def trending_start(moment):
+    """Начало окна, за которое считается trending."""
+    return moment - timedelta(days=settings.TRENDING_DAYS)
+
+
+def get_last_refresh():
+    return RecipeRanking.objects.aggregate(last=Max('updated'))['last']
+
+
+def get_stale_recipe_ids(since, now):
+    """Рецепты, рейтинг которых мог измениться после пересчёта в since.
+
+    Это рецепты без строки рейтинга, рецепты с изменившимися
+    счётчиками, рецепты с новыми событиями и рецепты, события
+    которых с тех пор вышли из окна trending.
+    """
+    stale = set(Recipe.objects.filter(
+        ranking__isnull=True).values_list('id', flat=True))
+    stale.update(RecipeRanking.objects.exclude(
+        popularity=F('recipe__favorites_count')
+        + F('recipe__shopping_cart_count')
+    ).values_list('recipe_id', flat=True))
+    for model in RANKING_EVENTS:
+        stale.update(model.objects.filter(created__gte=since).values_list(
+            'recipe_id', flat=True).distinct())
+        stale.update(model.objects.filter(
+            created__gte=trending_start(since),
+            created__lt=trending_start(now)
+        ).values_list('recipe_id', flat=True).distinct())
+    return stale
+
+
+def refresh_rankings(recipe_ids=None, batch_size=1000):
+    """Пересчитывает рейтинги рецептов пачками по batch_size.
+
+    Без recipe_ids пересчитываются все рецепты. Возвращает
+    количество обновлённых строк.
+    """
+    now = timezone.now()
+    recipes = Recipe.objects.order_by('id')
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    recipes = recipes.values_list(
+        'id', 'favorites_count', 'shopping_cart_count')
+    refreshed = 0
+    batch = []
+    for row in recipes.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            refreshed += save_rankings(batch, now)
+            batch = []
+    if batch:
+        refreshed += save_rankings(batch, now)
+    return refreshed
+
+
+def save_rankings(rows, now):
+    ids = [recipe_id for recipe_id, *_ in rows]
+    trending = Counter()
+    for model in RANKING_EVENTS:
+        trending.update(dict(model.objects.filter(
+            recipe_id__in=ids, created__gte=trending_start(now)
+        ).order_by().values('recipe_id').annotate(
+            total=Count('pk')).values_list('recipe_id', 'total')))
+    RecipeRanking.objects.bulk_create(
+        [
+            RecipeRanking(
+                recipe_id=recipe_id,
+                popularity=favorites_count + shopping_cart_count,
+                trending=trending[recipe_id],
+                updated=now,
+            )
+            for recipe_id, favorites_count, shopping_cart_count in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['recipe'],
+        update_fields=['popularity', 'trending', 'updated'],
+    )
+    return len(rows)
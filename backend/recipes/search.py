@@ -0,0 +1,143 @@
+"""Полнотекстовый поиск рецептов.
+
+В Postgres поиск идёт по столбцу Recipe.search_vector с GIN-индексом:
+название имеет вес A, названия ингредиентов - B, описание - C.
+В SQLite для локального запуска используется таблица FTS5
+recipes_recipe_fts с теми же приоритетами полей в bm25.
+Индекс обновляется сигналами рецептов, ингредиентов рецептов и
+ингредиентов (recipes.signals); bulk-операции и update() сигналов
+не отправляют, после них нужен update_search_index.
+"""
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection, connections, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Value
+
+from recipes.models import IngredientRecipe, Recipe
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+
+
+def normalize(value):
+    """FTS5 не отождествляет ё и е, поэтому ё заменяется заранее."""
+    return value.casefold().replace('ё', 'е')
+
+
+def get_ingredient_names(recipe_ids):
+    names = defaultdict(list)
+    for recipe_id, name in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids).values_list(
+            'recipe_id', 'ingredient__name'):
+        names[recipe_id].append(name)
+    return names
+
+
+def update_search_index(recipe_ids=None, batch_size=1000):
+    """Обновляет поисковый индекс рецептов recipe_ids (или всех)."""
+    recipes = Recipe.objects.order_by()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    if connection.vendor == 'postgresql':
+        ingredient_names = Subquery(
+            IngredientRecipe.objects.filter(recipe=OuterRef('pk'))
+            .order_by().values('recipe')
+            .annotate(names=StringAgg('ingredient__name', ' '))
+            .values('names')
+        )
+        recipes.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(ingredient_names, weight='B',
+                           config=SEARCH_CONFIG)
+            + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+        ))
+    elif connection.vendor == 'sqlite':
+        update_fts(recipes, recipe_ids, batch_size)
+
+
+def update_search_index_on_commit(recipe_ids):
+    """Обновляет индекс рецептов recipe_ids после фиксации транзакции,
+    когда сохранены и рецепт, и его ингредиенты."""
+    transaction.on_commit(lambda: update_search_index(recipe_ids))
+
+
+def update_fts(recipes, recipe_ids, batch_size):
+    with connection.cursor() as cursor:
+        if recipe_ids is None:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        else:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(recipe_id,) for recipe_id in recipe_ids]
+            )
+        rows = recipes.order_by('id').values_list('id', 'name', 'text')
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                insert_fts(cursor, batch)
+                batch = []
+        if batch:
+            insert_fts(cursor, batch)
+
+
+def insert_fts(cursor, rows):
+    names = get_ingredient_names([recipe_id for recipe_id, *_ in rows])
+    cursor.executemany(
+        f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+        'VALUES (%s, %s, %s, %s)',
+        [
+            (recipe_id, normalize(name),
+             normalize(' '.join(names[recipe_id])), normalize(text))
+            for recipe_id, name, text in rows
+        ]
+    )
+
+
+def remove_from_search_index(recipe_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id])
+
+
+def get_fts_query(value):
+    """Запрос FTS5: все слова по префиксу, спецсимволы экранируются."""
+    words = re.findall(r'\w+', normalize(value))
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, value):
+    """Фильтрует рецепты по запросу и добавляет релевантность
+    search_rank, по убыванию которой сортирует результат."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch')
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query))
+    elif vendor == 'sqlite':
+        query = get_fts_query(value)
+        if not query:
+            return queryset
+        # Таблица FTS5 присоединяется через extra: bm25() работает
+        # только в запросе, где эта таблица стоит во FROM с MATCH.
+        table = Recipe._meta.db_table
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        queryset = queryset.extra(
+            select={'search_rank': f'-bm25({FTS_TABLE}, {weights})'},
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[query],
+        )
+    else:
+        queryset = queryset.filter(
+            Q(name__icontains=value) | Q(text__icontains=value)
+        ).annotate(search_rank=Value(0.0))
+    return queryset.order_by('-search_rank', '-pub_date', '-id')
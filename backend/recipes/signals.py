@@ -0,0 +1,106 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.counters import recount_recipes, recount_users
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            RecipeRanking, ShoppingCart)
+from recipes.search import (remove_from_search_index,
+                            update_search_index_on_commit)
+from users.models import Follow, User
+
+COUNTERS = (
+    (Favorite, 'recipe_id', Recipe, 'favorites_count'),
+    (ShoppingCart, 'recipe_id', Recipe, 'shopping_cart_count'),
+    (Recipe, 'author_id', User, 'recipes_count'),
+    (Follow, 'author_id', User, 'followers_count'),
+)
+
+
+def connect_counter(sender, fk, target, field):
+    """Увеличивает счётчик field модели target при создании sender.
+
+    Удаление избранного, корзины и подписок уменьшает счётчики там,
+    где выполняется (recipes.counters.delete_counted), по фактически
+    удалённым строкам: post_delete приходит и для строк, которые
+    удалил одновременный запрос. Каскадное удаление пользователя или
+    рецепта пересчитывает затронутые счётчики (см. ниже); остальные
+    удаления в обход delete_counted исправляет recount_counters.
+    """
+
+    def increment(sender, instance, created, **kwargs):
+        if created:
+            target.objects.filter(pk=getattr(instance, fk)).update(
+                **{field: F(field) + 1})
+
+    post_save.connect(increment, sender=sender, weak=False,
+                      dispatch_uid=f'{field}_increment')
+
+
+for counter in COUNTERS:
+    connect_counter(*counter)
+
+
+@receiver(post_save, sender=Recipe, dispatch_uid='create_recipe_ranking')
+def create_recipe_ranking(sender, instance, created, **kwargs):
+    """Новый рецепт сразу попадает в рейтинг с нулевыми значениями."""
+    if created:
+        RecipeRanking.objects.create(recipe=instance)
+
+
+@receiver(pre_delete, sender=User, dispatch_uid='collect_user_counters')
+def collect_user_counters(sender, instance, **kwargs):
+    """Запоминает авторов и рецепты, счётчики которых изменит
+    каскадное удаление подписок, избранного и корзины пользователя."""
+    instance.counted_authors = set(Follow.objects.filter(
+        user=instance).values_list('author_id', flat=True))
+    instance.counted_recipes = {
+        recipe_id
+        for model in (Favorite, ShoppingCart)
+        for recipe_id in model.objects.filter(
+            user=instance).values_list('recipe_id', flat=True)
+    }
+
+
+@receiver(post_delete, sender=User, dispatch_uid='recount_user_counters')
+def recount_user_counters(sender, instance, **kwargs):
+    if instance.counted_authors:
+        recount_users(instance.counted_authors)
+    if instance.counted_recipes:
+        recount_recipes(instance.counted_recipes)
+
+
+@receiver(post_delete, sender=Recipe, dispatch_uid='recount_recipes_count')
+def recount_recipes_count(sender, instance, **kwargs):
+    recount_users([instance.author_id])
+
+
+@receiver(post_delete, sender=Recipe, dispatch_uid='remove_recipe_search')
+def remove_recipe_search(sender, instance, **kwargs):
+    remove_from_search_index(instance.pk)
+
+
+@receiver(post_save, sender=Recipe, dispatch_uid='update_recipe_search')
+def update_recipe_search(sender, instance, **kwargs):
+    update_search_index_on_commit([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe,
+          dispatch_uid='update_recipe_ingredients_search')
+def update_recipe_ingredients_search(sender, instance, origin=None,
+                                     **kwargs):
+    # Удалённый рецепт убирается из индекса целиком.
+    if isinstance(origin, Recipe) or getattr(origin, 'model', None) is Recipe:
+        return
+    update_search_index_on_commit([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient,
+          dispatch_uid='update_ingredient_search')
+def update_ingredient_search(sender, instance, created, update_fields,
+                             **kwargs):
+    """Переименование ингредиента меняет индекс рецептов с ним."""
+    if created or (update_fields and 'name' not in update_fields):
+        return
+    update_search_index_on_commit(IngredientRecipe.objects.filter(
+        ingredient=instance).values_list('recipe_id', flat=True))
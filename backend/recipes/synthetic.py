@@ -0,0 +1,176 @@
+"""Генерация синтетических данных для замеров производительности.
+
+Распределения приближены к реальным: немногие авторы пишут
+большую часть рецептов, на популярных авторов подписываются чаще,
+популярные рецепты чаще добавляют в избранное и корзину, а часть
+ингредиентов (соль, сахар) встречается почти везде.
+"""
+import random
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Max
+from PIL import Image
+
+from recipes.models import (Favorite, IngredientRecipe, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+SYNTHETIC_IMAGE = 'recipes/images/synthetic.png'
+SYNTHETIC_PASSWORD = 'synthetic-password'
+
+
+def next_number(model):
+    """Номер, с которого начинаются имена новых объектов: уникальные
+    имена не пересекаются с данными прошлых запусков."""
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def zipf_weights(count, exponent=1.1):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+class SyntheticData:
+    """Пакетная генерация пользователей, рецептов и связей.
+
+    Все объекты создаются bulk_create пачками по batch_size,
+    поэтому сигналы не срабатывают: счётчики, рейтинги и поисковый
+    индекс после генерации нужно пересчитать отдельно.
+    """
+
+    def __init__(self, seed=0, batch_size=5000):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+
+    def batches(self, objects):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def bulk_create(self, model, objects, **kwargs):
+        created = []
+        for batch in self.batches(objects):
+            created.extend(model.objects.bulk_create(batch, **kwargs))
+        return created
+
+    def sample(self, population, weights, count):
+        """Выборка без повторов, смещённая к началу population.
+
+        Размер ограничен половиной population, чтобы не вытягивать
+        редкие элементы хвоста распределения бесконечно.
+        """
+        count = min(count, len(population) // 2 or len(population))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(self.rng.choices(
+                population, weights=weights, k=count - len(chosen)))
+        return sorted(chosen)
+
+    def create_tags(self):
+        for name, _ in Tag.TAG_NAME_CHOICES:
+            Tag.objects.get_or_create(name=name)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_image(self):
+        if not default_storage.exists(SYNTHETIC_IMAGE):
+            buffer = BytesIO()
+            Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'PNG')
+            default_storage.save(
+                SYNTHETIC_IMAGE, ContentFile(buffer.getvalue()))
+        return SYNTHETIC_IMAGE
+
+    def create_users(self, count, prefix='synthetic'):
+        start = next_number(User)
+        password = make_password(SYNTHETIC_PASSWORD)
+        users = self.bulk_create(User, (
+            User(
+                email=f'{prefix}{number}@example.com',
+                username=f'{prefix}{number}',
+                first_name='Имя',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(start, start + count)
+        ))
+        return [user.pk for user in users]
+
+    def create_recipes(self, count, author_ids, ingredients, tag_ids,
+                       ingredients_per_recipe=(3, 12)):
+        """ingredients - список пар (id, name)."""
+        words = [word for _, name in ingredients for word in name.split()]
+        author_weights = zipf_weights(len(author_ids))
+        ingredient_weights = zipf_weights(len(ingredients))
+        image = self.create_image()
+        start = next_number(Recipe)
+        recipe_ids = []
+        for batch in self.batches(range(start, start + count)):
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    author_id=self.rng.choices(
+                        author_ids, weights=author_weights)[0],
+                    name=' '.join([*self.rng.sample(words, 3), str(number)]),
+                    text=' '.join(self.rng.choices(words, k=30)),
+                    cooking_time=self.rng.randint(5, 180),
+                    image=image,
+                )
+                for number in batch
+            ])
+            IngredientRecipe.objects.bulk_create([
+                IngredientRecipe(
+                    recipe=recipe, ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500)
+                )
+                for recipe in recipes
+                for ingredient_id, _ in self.sample(
+                    ingredients, ingredient_weights,
+                    self.rng.randint(*ingredients_per_recipe))
+            ])
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in self.rng.sample(
+                    tag_ids, self.rng.randint(1, len(tag_ids)))
+            ])
+            recipe_ids.extend(recipe.pk for recipe in recipes)
+        return recipe_ids
+
+    def per_user(self, mean):
+        """Количество связей пользователя: большинству мало, немногим
+        много (экспоненциальное распределение со средним mean)."""
+        return int(self.rng.expovariate(1 / mean)) if mean else 0
+
+    def create_follows(self, user_ids, author_ids, mean):
+        weights = zipf_weights(len(author_ids))
+        return self.bulk_create(Follow, (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.sample(
+                author_ids, weights, self.per_user(mean))
+            if author_id != user_id
+        ), ignore_conflicts=True)
+
+    def create_relations(self, model, user_ids, recipe_ids, mean):
+        """Избранное или корзина: популярность рецептов по Ципфу."""
+        recipe_ids = recipe_ids[:]
+        self.rng.shuffle(recipe_ids)
+        weights = zipf_weights(len(recipe_ids))
+        return self.bulk_create(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in self.sample(
+                recipe_ids, weights, self.per_user(mean))
+        ), ignore_conflicts=True)
+
+    def create_favorites(self, user_ids, recipe_ids, mean):
+        return self.create_relations(Favorite, user_ids, recipe_ids, mean)
+
+    def create_shopping_carts(self, user_ids, recipe_ids, mean):
+        return self.create_relations(
+            ShoppingCart, user_ids, recipe_ids, mean)
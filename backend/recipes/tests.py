@@ -0,0 +1,221 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.services import create_unique
+from recipes.counters import recount_recipes, recount_users
+from recipes.ingredient_import import JSONArrayReader
+from recipes.models import (Favorite, Ingredient, IngredientRecipe, Recipe,
+                            ShoppingCart)
+from recipes.search import search_recipes
+from users.models import Follow, User
+
+
+class CascadeCountersTest(TestCase):
+    """Счётчики после каскадного удаления пользователя и рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(
+                email=f'user{number}@foodgram.ru', username=f'user{number}',
+                first_name='Имя', last_name='Фамилия')
+            for number in range(3)
+        ]
+        cls.reader, cls.author, cls.other = cls.users
+        cls.reader.set_password('reader-password')
+        cls.reader.save()
+        cls.recipes = [
+            Recipe.objects.create(
+                author=author, name=f'рецепт {number}', text='текст',
+                cooking_time=10, image='recipes/images/recipe.png')
+            for number, author in enumerate(
+                (cls.author, cls.author, cls.other, cls.reader))
+        ]
+        for recipe in cls.recipes[:3]:
+            Favorite.objects.create(user=cls.reader, recipe=recipe)
+            Favorite.objects.create(user=cls.other, recipe=recipe)
+        ShoppingCart.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        for author in (cls.author, cls.other):
+            Follow.objects.create(user=cls.reader, author=author)
+        Follow.objects.create(user=cls.other, author=cls.author)
+
+    def assertCountersExact(self):
+        """Пересчёт не находит расхождений в счётчиках."""
+        self.assertEqual(recount_recipes(), 0)
+        self.assertEqual(recount_users(), 0)
+
+    def test_counters_after_setup(self):
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 2)
+        self.assertEqual(self.author.recipes_count, 2)
+        self.assertCountersExact()
+
+    def test_delete_user_through_api(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.delete(
+            reverse('api:users-me'),
+            {'current_password': 'reader-password'}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertCountersExact()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.shopping_cart_count, 0)
+
+    def test_delete_users_queryset(self):
+        User.objects.filter(pk__in=[self.reader.pk, self.other.pk]).delete()
+        self.assertCountersExact()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+    def test_delete_recipe(self):
+        self.recipes[0].delete()
+        self.assertCountersExact()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+
+
+class SearchIndexSignalsTest(TestCase):
+    """Поисковый индекс обновляется при изменениях через ORM."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@foodgram.ru', username='author')
+        cls.ingredient = Ingredient.objects.create(
+            name='шафран', measurement_unit='г')
+
+    def search(self, value):
+        return list(search_recipes(Recipe.objects.all(), value))
+
+    def test_orm_changes_reindexed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.author, name='плов', text='текст',
+                cooking_time=10, image='recipes/images/recipe.png')
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=1)
+        self.assertEqual(self.search('шафран'), [recipe])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'рис'
+            recipe.save()
+        self.assertEqual(self.search('рис'), [recipe])
+        self.assertEqual(self.search('плов'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient.name = 'куркума'
+            self.ingredient.save()
+        self.assertEqual(self.search('куркума'), [recipe])
+        self.assertEqual(self.search('шафран'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.recipe_ingredients.all().delete()
+        self.assertEqual(self.search('куркума'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientRecipe.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            recipe.delete()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.search('рис'), [])
+
+
+class CreateUniqueTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='user@foodgram.ru', username='user')
+        cls.recipe = Recipe.objects.create(
+            author=cls.user, name='рецепт', text='текст',
+            cooking_time=10, image='recipes/images/recipe.png')
+
+    def test_duplicate(self):
+        self.assertIsNotNone(
+            create_unique(Favorite, user=self.user, recipe=self.recipe))
+        self.assertIsNone(
+            create_unique(Favorite, user=self.user, recipe=self.recipe))
+        author = User.objects.create(
+            email='author@foodgram.ru', username='author')
+        create_unique(Follow, user=self.user, author=author)
+        self.assertIsNone(create_unique(Follow, user=self.user, author=author))
+
+    def test_other_integrity_error(self):
+        with self.assertRaises(IntegrityError):
+            create_unique(Favorite, user=self.user, recipe_id=None)
+
+
+class BdLoadTest(TestCase):
+    """Импорт ингредиентов командой bd_load."""
+
+    INGREDIENTS = [
+        {'name': f'ингредиент {number}', 'measurement_unit': 'г'}
+        for number in range(5)
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        return path
+
+    def load(self, path, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('bd_load', str(path), '--batch-size=2', *args,
+                     stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_rerun(self):
+        path = self.write('ingredients.json', json.dumps(self.INGREDIENTS))
+        stdout, _ = self.load(path)
+        self.assertIn('Добавлено: 5, уже в базе: 0, пропущено: 0', stdout)
+        stdout, _ = self.load(path)
+        self.assertIn('Добавлено: 0, уже в базе: 5, пропущено: 0', stdout)
+        self.assertEqual(Ingredient.objects.count(), 5)
+
+    def test_skipped_rows(self):
+        path = self.write('ingredients.csv', '\n'.join((
+            'name,measurement_unit',
+            'соль,г',
+            ',г',
+            'перец',
+            'соль,г',
+            'х' * 201 + ',г',
+            'сахар,г',
+        )))
+        stdout, stderr = self.load(path)
+        self.assertIn('Добавлено: 2, уже в базе: 0, пропущено: 4', stdout)
+        self.assertEqual(stderr.splitlines(), [
+            'Строка 3: поле name пустое',
+            'Строка 4: ожидаются название и единица измерения',
+            'Строка 6: поле name длиннее 200 символов',
+        ])
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', flat=True)),
+            {'соль', 'сахар'})
+
+    def test_invalid_json(self):
+        path = self.write('ingredients.json', '[{"name": "соль"')
+        with self.assertRaises(CommandError):
+            self.load(path)
+
+    def test_json_reader_chunks(self):
+        """Элементы, разрезанные границей куска, читаются целиком."""
+        content = json.dumps([*self.INGREDIENTS, 12345, 'строка', None])
+        for chunk_size in (1, 3, 7, 64):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(
+                    list(JSONArrayReader(StringIO(content), chunk_size)),
+                    json.loads(content))
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from recipes.admin import CountedRelationAdmin
 from users.models import User, Follow
 
 
@@ -18,7 +19,7 @@ class UserAdmin(admin.ModelAdmin):
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(CountedRelationAdmin):
     list_display = (
         'user',
         'author',
@@ -1,6 +1,8 @@
 class IsSubscribedMixin:
 
     def is_subscribed(self, author):
+        if hasattr(author, 'is_subscribed'):
+            return author.is_subscribed
         user = self.context.get('request').user
         if user.is_authenticated:
             return user.follower.filter(author=author).exists()
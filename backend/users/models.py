@@ -1,7 +1,26 @@
-from django.contrib.auth.models import AbstractUser
+from django.apps import apps
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
 
+class UserQuerySet(models.QuerySet):
+
+    def with_is_subscribed(self, user):
+        """Аннотирует признак подписки пользователя на авторов."""
+        if user.is_anonymous:
+            return self.annotate(is_subscribed=models.Value(False))
+        return self.annotate(
+            is_subscribed=models.Exists(
+                Follow.objects.filter(
+                    user=user, author=models.OuterRef('pk'))
+            )
+        )
+
+
+class FoodgramUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     email = models.EmailField(
         max_length=254,
@@ -25,6 +44,18 @@ class User(AbstractUser):
         max_length=150,
         verbose_name='Пароль',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',
+    )
+    objects = FoodgramUserManager()
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = [
         'username',
@@ -40,6 +71,27 @@ class User(AbstractUser):
         return self.username
 
 
+class FollowQuerySet(models.QuerySet):
+
+    def for_subscriptions(self, user, recipes_limit=None):
+        """Подписки пользователя с превью рецептов авторов.
+
+        Превью рецептов загружаются одним запросом: срез в Prefetch
+        Django выполняет через ROW_NUMBER() с разбиением по автору.
+        """
+        recipes = apps.get_model('recipes', 'Recipe').objects.order_by(
+            '-pub_date')
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        return self.filter(user=user).select_related('author').annotate(
+            is_subscribed=models.Value(True),
+        ).prefetch_related(
+            models.Prefetch(
+                'author__recipes', queryset=recipes, to_attr='recipes_preview'
+            )
+        ).order_by('id')
+
+
 class Follow(models.Model):
     """Подписка."""
 
@@ -56,6 +108,8 @@ class Follow(models.Model):
         related_name='following',
     )
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -1,6 +1,14 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination
 
+from api.pagination import AsyncPageNumberPagination
 
-class UsersPagination(PageNumberPagination):
+
+class UsersPagination(AsyncPageNumberPagination):
+    page_size = 5
+    page_size_query_param = 'limit'
+
+
+class SubscriptionsCursorPagination(CursorPagination):
     page_size = 5
     page_size_query_param = 'limit'
+    ordering = ('id',)
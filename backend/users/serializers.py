@@ -47,6 +47,7 @@ class RecipeInFollowSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'thumbnail',
             'cooking_time',
         )
         read_only_fields = ('__all__',)
@@ -75,7 +76,9 @@ class FollowSerializer(serializers.ModelSerializer, IsSubscribedMixin):
     )
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField(
+        source='author.recipes_count'
+    )
 
     class Meta:
         model = Follow
@@ -91,16 +94,18 @@ class FollowSerializer(serializers.ModelSerializer, IsSubscribedMixin):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         author = obj.author
         return self.is_subscribed(author)
 
     def get_recipes(self, obj):
+        if hasattr(obj.author, 'recipes_preview'):
+            return RecipeInFollowSerializer(
+                obj.author.recipes_preview, many=True).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         recipes = Recipe.objects.filter(author=obj.author)
         if limit and limit.isdigit():
             recipes = recipes[:int(limit)]
         return RecipeInFollowSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
@@ -4,55 +4,86 @@ from rest_framework import permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from api.instrumentation import ViewTimingMixin
+from api.metrics import TOGGLES
+from api.mixins import AsyncReadMixin
+from api.pagination import OptionalCursorPaginationMixin
+from api.replicas import ReplicaReadMixin
+from api.services import create_unique
+from recipes.counters import delete_counted
 from users.models import Follow, User
-from users.pagination import UsersPagination
+from users.pagination import SubscriptionsCursorPagination, UsersPagination
 from users.serializers import FollowSerializer, UserSerializer
 
 
-class UserViewSet(UserViewSet):
-    queryset = User.objects.all()
+class UserViewSet(ViewTimingMixin, ReplicaReadMixin, AsyncReadMixin,
+                  OptionalCursorPaginationMixin, UserViewSet):
+    async_actions = ('subscriptions',)
+    queryset = User.objects.order_by('id')
     serializer_class = UserSerializer
     pagination_class = UsersPagination
+    cursor_pagination_class = SubscriptionsCursorPagination
     permission_classes = (permissions.IsAuthenticated,)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return queryset.with_is_subscribed(self.request.user)
+        return queryset
+
     @action(detail=False, methods=['get'],
             permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request, *args, **kwargs):
-        follows = self.paginate_queryset(
-            Follow.objects.filter(user=self.request.user))
+        follows = self.paginate_queryset(self.get_subscriptions(request))
         serializer = FollowSerializer(
             follows, many=True, context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
 
+    async def asubscriptions(self, request, *args, **kwargs):
+        follows = await self.apaginate_queryset(
+            self.get_subscriptions(request))
+        serializer = FollowSerializer(
+            follows, many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    def get_subscriptions(self, request):
+        limit = request.query_params.get('recipes_limit')
+        return Follow.objects.for_subscriptions(
+            self.request.user,
+            int(limit) if limit and limit.isdigit() else None
+        )
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[permissions.IsAuthenticated])
     def subscribe(self, request, *args, **kwargs):
         follower = self.request.user
-        following = get_object_or_404(User, id=self.kwargs.get('id'))
-        follow_exists = Follow.objects.filter(
-            author=following, user=follower).exists()
+        author_id = self.kwargs.get('id')
         if request.method == 'POST':
-            if follow_exists:
+            following = get_object_or_404(User, id=author_id)
+            if follower == following:
                 return Response(
-                    {"errors": "Вы уже подписаны на этого автора!"},
+                    {"errors": "Нельзя подписаться на себя самого!"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            if follower == following:
+            follow = create_unique(Follow, user=follower, author=following)
+            if follow is None:
                 return Response(
-                    {"errors": "Нельзя подписаться на себя самого!"},
+                    {"errors": "Вы уже подписаны на этого автора!"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            TOGGLES.inc(kind='follow', action='add')
             serializer = FollowSerializer(
-                data=request.data,
-                context={'request': request})
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=follower, author=following)
+                follow, context={'request': request})
             return Response(serializer.data)
-        if not follow_exists:
+        deleted = delete_counted(
+            Follow.objects.filter(user=follower, author_id=author_id))
+        if not deleted:
+            get_object_or_404(User, id=author_id)
             return Response(
                 {"errors": "Вы не подписаны на этого автора!"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        Follow.objects.get(user=follower, author=following).delete()
+        TOGGLES.inc(kind='follow', action='remove')
         return Response(status=status.HTTP_204_NO_CONTENT)